@@ -21,10 +21,10 @@ whutshmup. If not, see <http://www.gnu.org/licenses/>.
 from os.path import join
 from pygame.event import Event, post
 
-from Common import GFX_PATH, SHOTSPEED, BOSS_ENTER, BOSS_EXIT
+from Common import GFX_PATH, BOSS_ENTER, BOSS_EXIT
 from Common import ENEMY_FIRE
 from Ship import Ship
-from Shot import ClusterShot, Smallshot, Mediumshot, Snipeshot
+from Shot import Shot, ClusterShot, Smallshot, Mediumshot, Snipeshot
 
 # *******************************************
 #
@@ -66,6 +66,7 @@ class Scout(Enemy):
     """
 
     scoutship = join(GFX_PATH, "enemyship.png")
+    assets = Enemy.assets + [scoutship]
 
     def __init__(self, common, player, init_pos, init_dir, speed):
         super(Scout, self).__init__(common, player, init_pos, 
@@ -80,6 +81,7 @@ class Alien(Enemy):
     """
     
     alienship = join(GFX_PATH, "enemyship.png")
+    assets = Enemy.assets + [alienship, Shot.smallshot]
 
     def __init__(self, common, player, init_pos, init_dir, speed):
         super(Alien, self).__init__(common, player, init_pos, 
@@ -98,7 +100,8 @@ class Alien(Enemy):
    
     def __create_shot(self):
         pos, shipdir = self.get_position(), self.get_direction()
-        return Smallshot(self.common, pos, shipdir, SHOTSPEED, None)
+        return Smallshot(self.common, pos, shipdir, self.options.shotspeed,
+                         None)
 
 class Bomber(Enemy):
     """
@@ -107,6 +110,7 @@ class Bomber(Enemy):
     """
     
     bombership = join(GFX_PATH, "bomber.png")
+    assets = Enemy.assets + [bombership] + ClusterShot.assets
 
     def __init__(self, common, player, init_pos, init_dir, speed):
         super(Bomber, self).__init__(common, player, init_pos, 
@@ -119,9 +123,9 @@ class Bomber(Enemy):
         if self.counter % 75 == 0:
             (x, y) = self.get_position()
             s_1 = self.__create_shot()
-            s_1.set_position((x - self.get_width() / 3, y))
+            s_1.set_position((x - self.get_width() // 3, y))
             s_2 = self.__create_shot()
-            s_2.set_position((x + self.get_width() / 3, y))
+            s_2.set_position((x + self.get_width() // 3, y))
             e_1 = Event(ENEMY_FIRE, ship = self, shot = s_1)
             e_2 = Event(ENEMY_FIRE, ship = self, shot = s_2)
             post(e_1)
@@ -138,6 +142,7 @@ class Chopper(Enemy):
     """
 
     choppership = join(GFX_PATH, "chopper.png")
+    assets = Enemy.assets + [choppership, Shot.smallshot]
 
     def __init__(self, common, player, init_pos, init_dir, speed):
         super(Chopper, self).__init__(common, player, init_pos, 
@@ -153,10 +158,10 @@ class Chopper(Enemy):
             s_2 = self.__create_shot()
             s_3 = self.__create_shot()
             s_4 = self.__create_shot()
-            s_1.set_position((x - self.get_width() / 7, y))
-            s_2.set_position((x + self.get_width() / 7, y))
-            s_3.set_position((x - 4 * self.get_width() / 7, y))
-            s_4.set_position((x + 4 * self.get_width() / 7, y))
+            s_1.set_position((x - self.get_width() // 7, y))
+            s_2.set_position((x + self.get_width() // 7, y))
+            s_3.set_position((x - 4 * self.get_width() // 7, y))
+            s_4.set_position((x + 4 * self.get_width() // 7, y))
             post(Event(ENEMY_FIRE, ship = self, shot = s_1))
             post(Event(ENEMY_FIRE, ship = self, shot = s_2))
             post(Event(ENEMY_FIRE, ship = self, shot = s_3))
@@ -164,7 +169,8 @@ class Chopper(Enemy):
 
     def __create_shot(self):
         pos, shipdir = self.get_position(), self.get_direction()
-        return Smallshot(self.common, pos, shipdir, SHOTSPEED, None)
+        return Smallshot(self.common, pos, shipdir, self.options.shotspeed,
+                         None)
 
 class Sniper(Enemy):
     """
@@ -172,6 +178,7 @@ class Sniper(Enemy):
     quite weak. They don't fire very often, but their shots are really fast.
     """
     snipership = join(GFX_PATH, "sniper.png")
+    assets = Enemy.assets + [snipership, Shot.smallshot, Shot.snipesound]
 
     def __init__(self, common, player, init_pos, init_dir, speed):
         super(Sniper, self).__init__(common, player, init_pos, 
@@ -198,6 +205,7 @@ class Kamikaze(Enemy):
     to kill.
     """
     kship = join(GFX_PATH, "kamikaze.png")
+    assets = Enemy.assets + [kship]
 
     def __init__(self, common, player, init_pos, init_dir, speed):
         super(Kamikaze, self).__init__(common, player, init_pos, 
@@ -239,16 +247,23 @@ class Boss(Enemy):
         post(Event(BOSS_EXIT))
         super(Boss, self).kill()
 
+    def get_record(self):
+        return (super(Boss, self).get_record(), self.delay)
+
+    def set_record(self, record):
+        (ship, self.delay) = record
+        super(Boss, self).set_record(ship)
+
     def add_damage(self, damage):
         if self.counter > self.delay:
             super(Boss, self).add_damage(damage)
 
-    def blit(self):
+    def draw(self, ops, shadow = True, flash = True):
         if self.is_exploding():
             # do something special, a large explosion or so
-            super(Boss, self).blit()
+            super(Boss, self).draw(ops, shadow, flash)
         else:
-            super(Boss, self).blit()
+            super(Boss, self).draw(ops, shadow, flash)
 
 class FirstBoss(Boss):
     """
@@ -259,6 +274,8 @@ class FirstBoss(Boss):
     Nickname: Spindelälgen (the spider elk)
     """
     ship = join(GFX_PATH, "boss.png")
+    assets = Enemy.assets + [ship, Shot.mediumshot, Shot.mediumsound]
+    assets += ClusterShot.assets
 
     def __init__(self, common, player, init_pos, init_dir, speed):
         super(FirstBoss, self).__init__(common, player, init_pos, 
@@ -302,6 +319,7 @@ class SecondBoss(Boss):
     but at a quite high intensity.
     """
     ship = join(GFX_PATH, "boss2.png")
+    assets = Enemy.assets + [ship] + ClusterShot.assets
 
     def __init__(self, common, player, init_pos, init_dir, speed):
         super(SecondBoss, self).__init__(common, player, init_pos,
@@ -311,6 +329,13 @@ class SecondBoss(Boss):
         self.dircounter = 0
         self.set_target((300, 100))
 
+    def get_record(self):
+        return (super(SecondBoss, self).get_record(), self.dircounter)
+
+    def set_record(self, record):
+        (boss, self.dircounter) = record
+        super(SecondBoss, self).set_record(boss)
+
     def update(self, *_):
         super(SecondBoss, self).update()
 
@@ -0,0 +1,321 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Allocations.py
+#
+# Tracks how much each frame allocates, and every garbage collection along
+# with the frame it happened in, to tell whether collections are behind the
+# frames that take too long.
+#
+
+import gc
+import re
+import sys
+from collections import Counter
+from timeit import default_timer as clock
+
+from Profiler import percentile
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+class AllocationTracker:
+    """
+    Measures allocations and garbage collections frame by frame, with frames
+    delimited by begin_frame() and end_frame() like in the Profiler.
+
+    Collections are reported by gc.callbacks where there is such a thing, and
+    otherwise read from the statistics the collector prints in debug mode.
+    A collection between two frames, like the ones Collector.idle runs, is
+    charged to the frame before it, whose spare time it used, once the next
+    frame begins.
+    Allocations are counted as the growth in objects tracked by the collector
+    during a frame, and by type, as the growth in the number of objects of
+    each type the collector tracks. Only those objects make collections
+    happen; images, masks, rects and events are not among them, and what
+    they take up is found among the call sites instead. Where tracemalloc
+    is available, the bytes allocated are also measured, and attributed to
+    the lines of code that allocated them. Taking a tracemalloc snapshot or
+    counting objects by type is slow, so it is only done every interval
+    frames, and the allocations of the frames in between are summed up.
+    """
+
+    def __init__(self, top = 15, depth = 4, interval = 1):
+        self.__top = top
+        self.__depth = depth
+        self.__interval = interval
+        self.__frame = 0
+        self.__started = None
+        # Per frame: (frame, seconds, objects, bytes, gc seconds)
+        self.__frames = []
+        # Per collection: (frame, generation, seconds)
+        self.__collections = []
+        self.__gc_start = None
+        # Seconds spent in collections since the last frame ended
+        self.__between = []
+        # Objects tracked by the collector by type, when last counted, and
+        # how many more of each type there were over all frames
+        self.__census = None
+        self.__types = Counter()
+        # Bytes and blocks allocated by each call site, from tracemalloc
+        self.__sites = {}
+        self.__snapshot = None
+        self.__tracing = False
+        self.__traced = False
+        self.__stderr = None
+        self.__debug = 0
+
+    def start(self):
+        if hasattr(gc, 'callbacks'):
+            gc.callbacks.append(self.__callback)
+        else:
+            self.__stderr = sys.stderr
+            self.__debug = gc.get_debug()
+            sys.stderr = StatsReader(self.__stderr, self.__collected)
+            gc.set_debug(self.__debug | gc.DEBUG_STATS)
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start(self.__depth)
+            self.__tracing = self.__traced = True
+
+    def stop(self):
+        if hasattr(gc, 'callbacks'):
+            if self.__callback in gc.callbacks:
+                gc.callbacks.remove(self.__callback)
+        elif self.__stderr is not None:
+            gc.set_debug(self.__debug)
+            sys.stderr = self.__stderr
+            self.__stderr = None
+        if self.__tracing:
+            tracemalloc.stop()
+            self.__tracing = False
+        self.__snapshot = None
+
+    def begin_frame(self):
+        if len(self.__between) > 0:
+            (frame, elapsed, objects, allocated, paused) = self.__frames[-1]
+            pause = sum(self.__between)
+            self.__frames[-1] = (frame, elapsed + pause, objects, allocated,
+                                 paused + pause)
+            self.__between = []
+        if self.__census is None:
+            self.__census = census()
+        self.__objects = gc.get_count()[0]
+        self.__collected_before = len(self.__collections)
+        if self.__tracing:
+            self.__bytes = tracemalloc.get_traced_memory()[0]
+            if self.__snapshot is None:
+                self.__snapshot = take_snapshot()
+        self.__started = clock()
+
+    def end_frame(self):
+        elapsed = clock() - self.__started
+        collections = self.__collections[self.__collected_before:]
+        # A collection resets the counter, so the count would make no sense
+        objects = None
+        if len(collections) == 0:
+            objects = gc.get_count()[0] - self.__objects
+        allocated = None
+        if self.__tracing:
+            allocated = tracemalloc.get_traced_memory()[0] - self.__bytes
+        if (self.__frame + 1) % self.__interval == 0:
+            self.__add_types()
+            if self.__tracing:
+                self.__add_sites()
+        self.__frames.append((self.__frame, elapsed, objects, allocated,
+                              sum(c[2] for c in collections)))
+        self.__frame += 1
+        self.__started = None
+
+    def get_frames(self):
+        return list(self.__frames)
+
+    def get_collections(self):
+        return list(self.__collections)
+
+    def report(self):
+        """
+        A summary as a dictionary: the collections per generation and how long
+        they took, how long frames with a collection in them took compared to
+        the others, the allocations per frame, the types of objects that grew
+        the most in number, and the call sites that allocated the most, if
+        known.
+        """
+        generations = {}
+        for (_, generation, seconds) in self.__collections:
+            times = generations.setdefault(generation, [])
+            times.append(seconds)
+        pauses = {}
+        for (generation, times) in generations.items():
+            times.sort()
+            pauses[generation] = { 'count' : len(times)
+                                 , 'total_ms' : sum(times) * 1000
+                                 , 'p50_ms' : percentile(times, 50) * 1000
+                                 , 'max_ms' : times[-1] * 1000
+                                 }
+
+        with_gc = sorted(f[1] for f in self.__frames if f[4] > 0)
+        without = sorted(f[1] for f in self.__frames if f[4] == 0)
+        objects = sorted(f[2] for f in self.__frames if f[2] is not None)
+        allocated = sorted(f[3] for f in self.__frames if f[3] is not None)
+        worst = sorted(self.__frames, key = lambda f: -f[4])[:self.__top]
+        return { 'frames' : len(self.__frames)
+               , 'collections' : pauses
+               , 'frame_ms_with_gc' : summary(with_gc, 1000)
+               , 'frame_ms_without_gc' : summary(without, 1000)
+               , 'objects_per_frame' : summary(objects)
+               , 'bytes_per_frame' : summary(allocated)
+               , 'worst_gc_frames' : [ { 'frame' : f[0]
+                                       , 'frame_ms' : f[1] * 1000
+                                       , 'gc_ms' : f[4] * 1000
+                                       } for f in worst if f[4] > 0 ]
+               , 'types' : self.top_types()
+               , 'call_sites' : self.top_sites() if self.__traced else None
+               }
+
+    def top_types(self):
+        """
+        The types of objects tracked by the collector that grew the most in
+        number, counted over all frames
+        """
+        types = sorted(self.__types.items(), key = lambda t: -t[1])
+        return [ { 'type' : name
+                 , 'objects' : count
+                 , 'objects_per_frame' : count / float(max(1, self.__frame))
+                 } for (name, count) in types[:self.__top] ]
+
+    def top_sites(self):
+        """
+        The call sites that allocated the most bytes, counted over all frames,
+        each as a traceback with the line that made the allocation first
+        """
+        sites = sorted(self.__sites.items(), key = lambda s: -s[1][0])
+        return [ { 'site' : site
+                 , 'bytes' : size
+                 , 'blocks' : count
+                 , 'bytes_per_frame' : size / float(max(1, self.__frame))
+                 } for (site, (size, count)) in sites[:self.__top] ]
+
+    def __add_types(self):
+        """
+        Adds how many more objects of each type there are than when they were
+        last counted to the types
+        """
+        counts = census()
+        for (name, count) in counts.items():
+            grown = count - self.__census[name]
+            if grown > 0:
+                self.__types[name] += grown
+        self.__census = counts
+
+    def __add_sites(self):
+        """
+        Adds what has been allocated since the last snapshot to the call sites
+        """
+        snapshot = take_snapshot()
+        for diff in snapshot.compare_to(self.__snapshot, 'traceback'):
+            if diff.size_diff <= 0:
+                continue
+            site = " <- ".join("%s:%d" % (frame.filename.split("/")[-1],
+                                          frame.lineno)
+                               for frame in reversed(diff.traceback))
+            (size, count) = self.__sites.get(site, (0, 0))
+            self.__sites[site] = (size + diff.size_diff,
+                                  count + max(0, diff.count_diff))
+        self.__snapshot = snapshot
+
+    def __callback(self, phase, info):
+        if phase == 'start':
+            self.__gc_start = clock()
+        elif self.__gc_start is not None:
+            self.__collected(info['generation'], clock() - self.__gc_start)
+            self.__gc_start = None
+
+    def __collected(self, generation, seconds):
+        if self.__started is None and len(self.__frames) > 0:
+            self.__between.append(seconds)
+            self.__collections.append((self.__frame - 1, generation, seconds))
+        else:
+            self.__collections.append((self.__frame, generation, seconds))
+
+class StatsReader:
+    """
+    Stands in for stderr while the collector prints its statistics, and picks
+    the generation and the time taken out of them. Anything else is passed on
+    to the real stderr.
+    """
+
+    collecting = re.compile(r"gc: collecting generation (\d+)")
+    done = re.compile(r"gc: done.*?([0-9.]+)s elapsed")
+
+    def __init__(self, stderr, collected):
+        self.__stderr = stderr
+        self.__collected = collected
+        self.__generation = None
+        self.__line = ""
+
+    def write(self, text):
+        self.__line += text
+        while "\n" in self.__line:
+            (line, self.__line) = self.__line.split("\n", 1)
+            self.__read(line + "\n")
+
+    def flush(self):
+        self.__stderr.flush()
+
+    def __read(self, line):
+        if not line.startswith("gc: "):
+            self.__stderr.write(line)
+            return
+        match = StatsReader.collecting.match(line)
+        if match:
+            self.__generation = int(match.group(1))
+        match = StatsReader.done.match(line)
+        if match and self.__generation is not None:
+            self.__collected(self.__generation, float(match.group(1)))
+            self.__generation = None
+
+def census():
+    """ How many objects of each type the collector tracks, by type name """
+    return Counter(type_name(obj) for obj in gc.get_objects())
+
+def type_name(obj):
+    """ The name of the class of an object, old-style classes included """
+    kind = type(obj)
+    if kind.__name__ == 'instance':
+        kind = obj.__class__
+    return kind.__name__
+
+def take_snapshot():
+    """ A tracemalloc snapshot, without what the tracking allocated itself """
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__),
+              tracemalloc.Filter(False, __file__)]
+    return tracemalloc.take_snapshot().filter_traces(ignore)
+
+def summary(values, scale = 1):
+    """ Mean, median and 95th percentile of a sorted list, or None if empty """
+    if len(values) == 0:
+        return None
+    return { 'mean' : sum(values) * scale / float(len(values))
+           , 'p50' : percentile(values, 50) * scale
+           , 'p95' : percentile(values, 95) * scale
+           , 'max' : values[-1] * scale
+           }
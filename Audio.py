@@ -0,0 +1,135 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License along with 
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Audio.py
+#
+# Setup of the audio output. Smaller mixer buffers mean less delay between a
+# sound effect being triggered and it being heard, but if the buffer is too
+# small the audio thread cannot keep up and the sound crackles.
+#
+
+import os
+from time import time, sleep
+
+import pygame
+from pygame.mixer import Sound
+
+from Profiler import percentile
+
+# Buffer sizes to choose from, in samples. Smaller than this is not worth it.
+BUFFER_SIZES = [512, 1024, 2048, 4096]
+
+def init_mixer(frequency, buffer):
+    """
+    According to the documentation for the mixer module, safest way is to do
+    mixer.pre_init, then pygame.init and then mixer.init.
+    """
+    pygame.mixer.pre_init(frequency = frequency, buffer = buffer)
+    pygame.init()
+    pygame.mixer.init(frequency = frequency, buffer = buffer)
+
+def buffer_time(buffer, frequency):
+    """ The time in seconds it takes to play one buffer """
+    return float(buffer) / frequency
+
+def scheduling_jitter(samples = 200, interval = 0.002):
+    """
+    Measures how late a sleeping thread wakes up on this machine, which is
+    about how late the audio thread may be to fill its next buffer. Returns
+    the 99th percentile of the delays, in seconds.
+    """
+    delays = []
+    for _ in range(samples):
+        before = time()
+        sleep(interval)
+        delays.append(max(0, time() - before - interval))
+    delays.sort()
+    return percentile(delays, 99)
+
+def choose_buffer(frequency, margin = 4.0):
+    """
+    Picks the smallest buffer that lasts long enough to cover the measured
+    scheduling jitter by the given margin, so it should never run dry
+    """
+    jitter = scheduling_jitter()
+    for size in BUFFER_SIZES:
+        if buffer_time(size, frequency) >= margin * jitter:
+            return size
+    return BUFFER_SIZES[-1]
+
+def measure_latency(frequency, buffer, trials = 10):
+    """
+    Measures the time from playing a sound until its first sample is written
+    as output. This needs the SDL disk audio driver, which writes the output
+    to a file instead of a sound card, so it can run without any audio
+    hardware. The mixer must not be initialized when this is called.
+
+    Returns the minimum, median and maximum latency over all trials in
+    seconds. With a sound card there is usually one more buffer of delay in
+    the driver, which is not included here.
+    """
+    outfile = os.environ["SDL_DISKAUDIOFILE"] = "latency-%d.raw" % os.getpid()
+    # The disk driver should write a buffer exactly as often as a sound card
+    # would ask for one
+    delay = int(buffer_time(buffer, frequency) * 1000)
+    os.environ["SDL_DISKAUDIODELAY"] = str(delay)
+    os.environ["SDL_AUDIODRIVER"] = "disk"
+
+    pygame.mixer.init(frequency = frequency, size = -16, channels = 2,
+                      buffer = buffer)
+    # A 10 ms click at a constant level, easy to find in the output
+    click = Sound(buffer = b"\x80\x3e" * (2 * frequency // 100))
+    output = open(outfile, "rb")
+    latencies = []
+    try:
+        data = b""
+        for _ in range(trials):
+            # Let the click fade out and the output run for a while first
+            sleep(0.1)
+            data += output.read()
+            written = len(data)
+            triggered = time()
+            click.play()
+            onset = -1
+            while onset < 0 and time() - triggered < 1:
+                data += output.read()
+                onset = first_sound(data, written)
+                sleep(0.0005)
+            if onset >= 0:
+                latencies.append(time() - triggered)
+    finally:
+        output.close()
+        pygame.mixer.quit()
+        os.remove(outfile)
+    return summary(latencies)
+
+def first_sound(data, start):
+    """ Index of the first byte from start that is not silence, or -1 """
+    rest = data[start:].lstrip(b"\x00")
+    if len(rest) == 0:
+        return -1
+    return len(data) - len(rest)
+
+def summary(values):
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return { 'min' : values[0], 'median' : values[len(values) // 2]
+           , 'max' : values[-1] }
@@ -0,0 +1,118 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Collector.py
+#
+# Decides when the garbage collector runs while a level is played, so that
+# collections happen in the time left over at the end of frames instead of in
+# the middle of them.
+#
+
+import gc
+from timeit import default_timer as clock
+
+class Collector:
+    """
+    Turns automatic garbage collection off for the length of a level, and
+    runs the collections that would have been run in the idle time at the end
+    of frames instead. A collection is only run if the last collection of the
+    same generation took less than both the budget and the time left, unless
+    the youngest generation has grown past the limit, in which case that one
+    is run anyway so that memory use stays bounded.
+
+    Whatever is alive when the level starts, like the resources, the level
+    and the player, is frozen where gc.freeze() exists, so that the oldest
+    generation does not have to go through all of it over and over.
+    """
+
+    def __init__(self, budget = 0.005, limit = 20000):
+        self.__budget = budget
+        self.__limit = limit
+        self.__was_enabled = True
+        self.__frozen = False
+        # Time the last collection of each generation took
+        self.__last = [0.0, 0.0, 0.0]
+        self.__collections = [0, 0, 0]
+        self.__forced = 0
+        self.__time = 0.0
+
+    def begin_level(self):
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+            self.__frozen = True
+        self.__was_enabled = gc.isenabled()
+        gc.disable()
+
+    def end_level(self):
+        if self.__frozen:
+            gc.unfreeze()
+            self.__frozen = False
+        if self.__was_enabled:
+            gc.enable()
+
+    def idle(self, slack):
+        """
+        Called at the end of a frame with the seconds left until the next one.
+        Runs the oldest collection that is due and fits. A younger one that is
+        due is run if an older one does not fit, so that a slow oldest
+        generation does not keep the young ones from being collected.
+        """
+        oldest = due()
+        if oldest is None:
+            return
+        if gc.get_count()[0] > self.__limit:
+            # The youngest generation is the cheapest to get back down
+            self.collect(0)
+            self.__forced += 1
+            return
+        for generation in range(oldest, -1, -1):
+            if due(generation) != generation:
+                continue
+            if self.__last[generation] <= min(slack, self.__budget):
+                self.collect(generation)
+                return
+
+    def collect(self, generation = 2):
+        start = clock()
+        gc.collect(generation)
+        elapsed = clock() - start
+        self.__last[generation] = elapsed
+        self.__collections[generation] += 1
+        self.__time += elapsed
+
+    def get_stats(self):
+        return { 'collections' : list(self.__collections)
+               , 'forced' : self.__forced
+               , 'seconds' : self.__time
+               }
+
+def due(oldest = 2):
+    """
+    The oldest generation, up to the given one, that the collector would have
+    collected by now, had it been enabled, or None if no collection is due
+    """
+    counts = gc.get_count()
+    thresholds = gc.get_threshold()
+    for generation in range(oldest, -1, -1):
+        threshold = thresholds[generation]
+        if threshold > 0 and counts[generation] > threshold:
+            return generation
+    return None
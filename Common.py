@@ -18,10 +18,13 @@ whutshmup. If not, see <http://www.gnu.org/licenses/>.
  
 """
 
-from pygame.locals import USEREVENT
+from pygame.locals import USEREVENT, K_p, K_F3
 
+# The window at scale 1. Windows of other sizes show the same layout scaled,
+# see Graphics.py. The game itself always plays on a field of GAME_SIZE.
 WINDOW_SIZE = (800, 600)
 GAME_WIDTH = 600
+GAME_SIZE = (GAME_WIDTH, WINDOW_SIZE[1])
 FRAMERATE = 30
 
 # Game states
@@ -32,20 +35,53 @@ DIED = 3
 QUITGAME = 4
 ABORTED = 5
 
+# Pauses and continues the game
+PAUSE_KEY = K_p
+# Shows and hides the frame profiler
+PROFILE_KEY = K_F3
+
+# Flags in the state of ACTIVEEVENT events, from SDL. Not exported by pygame.
+APPINPUTFOCUS = 0x02
+APPACTIVE = 0x04
+
 # Values
 ENEMY_FIRE = USEREVENT + 1
 USER_FIRE  = USEREVENT + 2
 BOSS_ENTER = USEREVENT + 4
 BOSS_EXIT  = USEREVENT + 5
 PLAYER_DIED = USEREVENT + 6
+MENU_TIMEOUT = USEREVENT + 7
 
 # Speeds, default values
 SHIPSPEED = 10
-ENEMYSPEED = 3
+ENEMYSPEED = 5
 SHOTSPEED = 25
 
+# Distance ahead of the player at which boss music starts to be prefetched
+BOSS_LOOKAHEAD = 600
+
 # Paths
 GFX_PATH = "graphics"
 SND_PATH = "sound"
 MP3_PATH = "music"
+CACHE_PATH = "cache"
+
+# Memory budget for cached graphics and sounds in bytes, None for no limit
+ASSET_BUDGET = None
+
+# Longest garbage collection in seconds that may be run at the end of a frame
+# during a level, see Collector.py. None leaves the collector to run whenever
+# it wants, which may be in the middle of a frame.
+GC_BUDGET = 0.005
+
+# Frame time in seconds that the quality of the graphics is lowered to stay
+# within, see Quality.py. None keeps the full quality all the time.
+FRAME_BUDGET = 1.0 / FRAMERATE
+
+# Whether frames are painted and put on the screen in a thread of their own,
+# while the next frame is simulated, see Render.py
+RENDER_THREAD = False
 
+# Directory to save a recording of the input of every level played in, or
+# None to not record. Recordings are played back with bench/replay.py.
+RECORD_PATH = None
@@ -24,53 +24,116 @@ whutshmup. If not, see <http://www.gnu.org/licenses/>.
 # loads levels.
 #
 
-from os.path import join
+import gc
+from os import makedirs
+from os.path import isdir, join
+from random import randrange
+from time import strftime
 
 import pygame
-from pygame.locals import KEYDOWN, QUIT, K_y, K_n
+from pygame.locals import KEYDOWN, QUIT, NOEVENT, K_y, K_n
 
+from Audio import init_mixer, choose_buffer
 from Graphics import Graphics
 from Logic import GameLogic
 
-from Common import MP3_PATH
-from Common import CLEARED, DIED, ABORTED
+from Common import GFX_PATH, ASSET_BUDGET, FRAMERATE, MENU_TIMEOUT
+from Common import RECORD_PATH, GC_BUDGET, FRAME_BUDGET, RENDER_THREAD
+from Common import CLEARED, DIED, ABORTED, QUITGAME, PAUSE_KEY, PROFILE_KEY
+from Common import USER_FIRE, ENEMY_FIRE, BOSS_ENTER, BOSS_EXIT, PLAYER_DIED
 from Resources import Resources
 from Options import Options
-from Level import Level, level_convert
+from Alien import all_ships
+from Level import Level, EndlessLevel, level_convert
+from Music import Music
+from Player import Player
+from Replay import Recording, ENDLESS
+from Ship import Ship
+from Shot import Shot, ClusterShot
 
 
 class Controller:
     
     #
     #
-    def __init__(self):
+    def __init__(self, resolution = None):
         """
-        pygame.init() does initialize parts of the sound, but according to the
-        documentation for the mixer module, safest way is to do mixer.pre_init,
-        then pygame.init and then mixer.init. The controller also makes sure any
-        resources needed in the game are preloaded.
+        Initializes pygame and the mixer with the audio settings from the
+        options. If no buffer size has been set, the smallest one that works on
+        this machine is picked and saved. The controller also makes sure any
+        resources needed in the game are preloaded. A resolution, if given, is
+        used instead of the one in the options, and saved along with them once
+        a window of that size has been made.
         """
         self.__options = Options.load()
-        self.__resources = Resources()
-        pygame.mixer.pre_init(frequency = 44100, buffer = 2048) 
-        pygame.init()
-        pygame.mixer.init(frequency = 44100, buffer = 2048)
+        if resolution is not None:
+            self.__options.resolution = resolution
+        self.__resources = Resources(budget = ASSET_BUDGET)
+        o = self.__options
+        if o.audio_buffer is None:
+            o.audio_buffer = choose_buffer(o.audio_frequency)
+            o.save()
+        init_mixer(o.audio_frequency, o.audio_buffer)
+        self.__music = Music(self.__options)
+        self.__music.prefetch(Music.cruising)
         self.__graphics = Graphics(self.__resources, self.__options)
-        # Load all graphics and sound effects before the game is started
-        self.__resources.preload_all()
+        if resolution is not None:
+            self.__options.save()
+        # Load all graphics and sound effects before the game is started,
+        # unless the assets have to fit a budget. Then only the ones that are
+        # always needed are loaded, and the rest are loaded when used.
+        if ASSET_BUDGET is None:
+            self.__resources.preload_all()
+        else:
+            for key in pinned_assets():
+                self.__resources.pin(key)
         self.__logic = None
 
     def main(self):
-        self.main_menu()
+        """
+        Shows the screens of the game one after the other. Every screen returns
+        the next screen to show, or None when the game should end, so moving
+        between menus and games never makes the call stack any deeper.
+        """
+        screen = self.main_menu
+        while screen is not None:
+            screen = screen()
+
+    def enter_game(self):
+        """
+        Sets up a new game logic with a player in it. Called before a game.
+        """
+        self.__logic = GameLogic(self.__graphics, self.__resources, 
+                                 self.__options, self.__music)
+        self.__logic.add_player()
+        if GC_BUDGET is not None:
+            self.__logic.schedule_gc(GC_BUDGET)
+        if FRAME_BUDGET is not None:
+            self.__logic.enable_governor(FRAME_BUDGET)
+        if RENDER_THREAD:
+            self.__logic.enable_render_thread()
+
+    def exit_game(self):
+        """
+        Called when a game is over. Drops the game logic along with any events
+        still referring to its sprites, so all of it can be freed before the
+        next screen is shown.
+        """
+        # Turn off the music, since game is obviously over
+        self.__music.stop()
+        self.__logic.disable_render_thread()
+        pygame.event.clear([USER_FIRE, ENEMY_FIRE, BOSS_ENTER, BOSS_EXIT,
+                            PLAYER_DIED])
+        self.__logic = None
+        # The menus have time to spare, unlike the game
+        gc.collect()
 
     def play_game(self):
         """
         Initialize the game logic and handle whatever the game logic returns
         from a run of the game. 
         """
-        self.__logic = GameLogic(self.__graphics, self.__resources, 
-                                 self.__options)
-        self.__logic.add_player()
+        self.enter_game()
         levels = level_convert()
         status = CLEARED
         #
@@ -80,39 +143,83 @@ class Controller:
             lev = levels[i]
             # Background music
             # TODO: Different music for different levels
-            if self.__options.music:
-                pygame.mixer.music.load(join(MP3_PATH,"cruising.mp3"))
-                pygame.mixer.music.set_volume(0.8)
-                pygame.mixer.music.play()
+            self.__music.play(Music.cruising)
 
-            # Prepare the level
+            # Prepare the level. Its assets are normally already prefetched
+            # while the previous level cleared screen was shown.
+            self.__resources.preload(level_assets(lev))
             self.__logic.clear()
             self.__graphics.reset_distance()
             self.__graphics.set_scroll(5)
             self.__logic.set_level(lev)
             
-            status = self.__logic.game_loop()
+            status = self.play_level(i)
             if status != CLEARED:
                 break
             # Last level cleared = game cleared!
             if i != len(levels)-1:
-                self.level_cleared()
+                if self.level_cleared(levels[i+1]) == QUIT:
+                    status = QUITGAME
+                    break
 
-        # Turn off the music, since game is obviously over
-        pygame.mixer.music.stop()
+        self.exit_game()
 
         #
         # Depending on how the game went, show some information, or not.
         #
         if status == CLEARED:
-            self.game_cleared()
-            self.main_menu()
+            return self.game_cleared
         elif status == DIED:
-            self.game_over()
+            return self.game_over
         elif status == ABORTED:
-            self.main_menu()
+            return self.main_menu
         else:
-            self.quit()
+            return self.quit
+
+    def play_endless(self, seed = None):
+        """
+        Plays a procedurally generated level that never ends, until the player
+        dies or aborts. The same seed always gives the same level, which makes
+        this useful as a load generator for long profiling sessions too.
+        """
+        self.enter_game()
+        self.__music.play(Music.cruising, -1)
+
+        # Pick the seed here, so that a recording of the game can tell it
+        if seed is None:
+            seed = randrange(1 << 31)
+        level = EndlessLevel(seed)
+        self.__resources.preload(level_assets(level))
+        self.__logic.clear()
+        self.__graphics.reset_distance()
+        self.__graphics.set_scroll(5)
+        self.__logic.set_level(level)
+
+        status = self.play_level(ENDLESS, seed)
+        self.exit_game()
+        if status == QUITGAME:
+            return self.quit
+        else:
+            return self.main_menu
+
+    def play_level(self, level, seed = 0):
+        """
+        Runs the game loop on a level that is all set up. If RECORD_PATH is set,
+        the input is recorded and saved there when the level ends, so that the
+        same game can be replayed later on.
+        """
+        if RECORD_PATH is None:
+            return self.__logic.game_loop()
+        recording = Recording(level, seed, self.__logic.get_player())
+        self.__logic.set_recording(recording)
+        status = self.__logic.game_loop()
+        self.__logic.set_recording(None)
+        if not isdir(RECORD_PATH):
+            makedirs(RECORD_PATH)
+        name = "%s-%s.rec" % (strftime("%Y%m%d-%H%M%S"),
+                              "endless" if level == ENDLESS else level + 1)
+        recording.save(join(RECORD_PATH, name))
+        return status
 
 #
 # Menus below
@@ -120,9 +227,10 @@ class Controller:
 
     def main_menu(self):
         o = self.__options
-        entries = ["Start game", "Instructions", "Options", "Quit"]
-        funs = [lambda _: self.play_game(), lambda _: self.instructions()
-               ,lambda _: self.options(), lambda _: self.quit()]
+        entries = ["Start game", "Endless mode", "Instructions", "Options",
+                   "Quit"]
+        screens = [self.play_game, self.play_endless, self.instructions,
+                   self.options, self.quit]
         active = 0
         self.__graphics.main_menu(entries, active)
         keys = [o.up, o.down, o.confirm]
@@ -135,50 +243,77 @@ class Controller:
             self.__graphics.main_menu(entries, active)
             kpress = wait_for_key(keys)
         if kpress == o.confirm:
-            f = funs[active]
-            f(0)
+            return screens[active]
         else:
-            self.quit()
+            return self.quit
 
     # TODO: Collect and print stats from the level, too
-    def level_cleared(self):
+    def level_cleared(self, next_level):
+        """
+        While the player looks at the level cleared screen, assets not needed
+        by the next level are released and the ones that are needed are loaded
+        in the background, so nothing has to be read from disk mid-level.
+        Rotated images scaled for this level, and the garbage left from it,
+        are let go of meanwhile, too. Returns the key pressed, or QUIT if the
+        window was closed.
+        """
+        assets = level_assets(next_level)
+        self.__resources.retain(assets)
+        self.__graphics.forget_rotations()
+        self.__resources.prefetch(assets)
         self.__graphics.paint_level_cleared()
-        anykey()
+        gc.collect()
+        key = anykey()
+        self.__resources.collect()
+        return key
 
     # TODO: Highscores and stuff
     def game_cleared(self):
         self.__graphics.paint_game_cleared()
-        anykey()
+        if anykey() == QUIT:
+            return self.quit
+        return self.main_menu
 
     # Shows an options menu and allows setting various game parameters
-    def options(self, active = 0):
+    def options(self):
         o = self.__options
-        key_opts = [ ("Left:", o.left), ("Down:", o.down), ("Up:", o.up)
-                   , ("Right:", o.right), ("Fire:", o.fire)
-                   , ("Abort:", o.abort), ("Confirm:", o.confirm)
-                   ]
-        bool_opts = [ ("Fullscreen: ", o.fullscreen), ("Music: ", o.music)
-                    , ("Sound effects: ", o.sfx)
-                    ]
-        self.__graphics.paint_options(key_opts, bool_opts, active, False)
-        keys = [o.up, o.down, o.confirm, o.abort]
-        kpress = wait_for_key(keys)
-        while kpress in [o.up, o.down]:
-            if kpress == o.up and active > 0:
-                active -= 1
-            elif kpress == o.down and active < 9:
-                active += 1
+        active = 0
+        while True:
+            key_opts = [ ("Left:", o.left), ("Down:", o.down), ("Up:", o.up)
+                       , ("Right:", o.right), ("Fire:", o.fire)
+                       , ("Abort:", o.abort), ("Confirm:", o.confirm)
+                       ]
+            bool_opts = [ ("Fullscreen: ", o.fullscreen), ("Music: ", o.music)
+                        , ("Sound effects: ", o.sfx)
+                        ]
             self.__graphics.paint_options(key_opts, bool_opts, active, False)
+            keys = [o.up, o.down, o.confirm, o.abort]
             kpress = wait_for_key(keys)
+            while kpress in [o.up, o.down]:
+                if kpress == o.up and active > 0:
+                    active -= 1
+                elif kpress == o.down and active < 9:
+                    active += 1
+                self.__graphics.paint_options(key_opts, bool_opts, active, 
+                                              False)
+                kpress = wait_for_key(keys)
+
+            if kpress == o.abort:
+                return self.main_menu
+            elif kpress != o.confirm: # event == QUIT
+                return self.quit
 
-        if kpress == o.confirm:
             # Key options
             if active < len(key_opts):
                 # Paint selection and wait for input
                 self.__graphics.paint_options(key_opts, bool_opts, active, True)
                 key = anykey()
-                # Only keys that are not already assigned may be chosen
-                if key not in self.__options.get_all_keys():
+                if key == QUIT:
+                    return self.quit
+                # Only keys that are not already assigned may be chosen, and
+                # not the ones the game uses for itself either
+                reserved = [PAUSE_KEY, PROFILE_KEY]
+                if key not in self.__options.get_all_keys() + reserved:
                     self.__options.set_index(active, key)
                     self.__options.save()
             
@@ -192,11 +327,6 @@ class Controller:
                 if fs != self.__options.fullscreen:
                     pygame.display.quit()
                     self.__graphics = Graphics(self.__resources, self.__options)
-            self.options(active)
-        elif kpress == o.abort:
-            self.main_menu()
-        else: # event == QUIT
-            self.quit()
 
     # TODO: A describing text about the gameplay
     def instructions(self):
@@ -216,22 +346,36 @@ class Controller:
             elif kpress == opts.right:
                 active += 1
         if kpress == QUIT:
-            self.quit()
+            return self.quit
         else:
-            self.main_menu()
+            return self.main_menu
 
     def game_over(self):
         self.__graphics.game_over()
         # There is an option of restarting without going through the main menu
         if yn_key():
-            self.play_game()
+            return self.play_game
         else:
-            self.main_menu()
+            return self.main_menu
 
     def quit(self):
         self.__options.save()
+        self.__music.quit()
         pygame.mixer.quit()
         pygame.quit()
+        return None
+
+# Assets that are needed all the time, whatever the level
+def pinned_assets():
+    return [ Player.shipfile, join(GFX_PATH, "BG-bluepattern.png")
+           , Shot.playershot, Shot.smallshot, Shot.mediumshot, Shot.largeshot
+           , Shot.playersound, Shot.mediumsound, Shot.snipesound
+           , ClusterShot.clustersound, Ship.explosionsound, Ship.hitsound
+           ]
+
+# Everything a level needs, including the assets needed in every level
+def level_assets(level):
+    return level.manifest() | set(pinned_assets()) | set(Player.assets)
 
 # Waits for keystroke. 
 # Returns True if y is pressed, False if n is pressed.
@@ -240,22 +384,48 @@ def yn_key():
     k = wait_for_key([K_y, K_n])
     return k == K_y
 
-# General function for key handling
-def wait_for_key(keys):
-    klist = pygame.event.get([KEYDOWN, QUIT])
+# General function for key handling. Blocks until one of the given keys is
+# pressed, or the window is closed, without using any CPU while waiting. If a
+# paint function is given, the screen is animated by calling it framerate
+# times per second while waiting.
+def wait_for_key(keys, paint = None, framerate = FRAMERATE):
+    timeout = 0
+    if paint is not None:
+        timeout = 1000 // framerate
+        clock = pygame.time.Clock()
+        paint()
     while True:
-        for event in klist:
-            if event.type == QUIT: 
-                return QUIT
-            elif event.key in keys: 
-                return event.key
-        klist = pygame.event.get([KEYDOWN, QUIT])
-
-# Waits for any keystroke to be pressed. Uses polling :/
+        event = wait_event(timeout)
+        if event.type == QUIT: 
+            return QUIT
+        elif event.type == KEYDOWN and event.key in keys: 
+            return event.key
+        elif event.type == NOEVENT and paint is not None:
+            clock.tick(framerate)
+            paint()
+
+# Waits for any keystroke to be pressed, and returns it. Returns QUIT if the
+# window is closed instead.
 def anykey():
-    keys = pygame.event.get(KEYDOWN)
-    while len(keys) == 0:
-        keys = pygame.event.get(KEYDOWN)
-    # Return the first key we found
-    return keys[0].key
+    event = wait_event()
+    while event.type not in [KEYDOWN, QUIT]:
+        event = wait_event()
+    if event.type == QUIT:
+        return QUIT
+    return event.key
 
+# Blocks until there is an event, and returns it. If there is none within
+# timeout milliseconds, a NOEVENT event is returned. No timeout if it is 0.
+def wait_event(timeout = 0):
+    if timeout <= 0:
+        return pygame.event.wait()
+    try:
+        return pygame.event.wait(timeout)
+    except TypeError:
+        # Older versions of pygame have no timeout, so use a timer instead
+        pygame.time.set_timer(MENU_TIMEOUT, timeout)
+        event = pygame.event.wait()
+        pygame.time.set_timer(MENU_TIMEOUT, 0)
+        if event.type == MENU_TIMEOUT:
+            return pygame.event.Event(NOEVENT)
+        return event
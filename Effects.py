@@ -0,0 +1,119 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License along with 
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import pygame
+from pygame.mixer import Channel
+
+from Ship import Ship
+from Shot import Shot, ClusterShot
+
+class Effects:
+    """
+    Plays sound effects loaded through Resources. Each effect has its own
+    group of reserved mixer channels, so it can never play on more voices at
+    once than it has channels, and a burst of one effect cannot steal the
+    channels of another. Triggering the same effect several times during a
+    tick plays it only once, when flush() is called at the end of the tick.
+    """
+
+    # Volume and number of voices for each effect
+    settings = { Ship.explosionsound : (0.2, 4)
+               , Ship.hitsound : (0.4, 2)
+               , Shot.playersound : (0.4, 2)
+               , Shot.mediumsound : (0.4, 3)
+               , Shot.snipesound : (0.4, 2)
+               , ClusterShot.clustersound : (0.4, 3)
+               }
+    default = (0.4, 2)
+
+    def __init__(self, resources, options, muted = False):
+        """
+        Muted effects never play anything, whatever the options say, and do
+        not need the mixer at all.
+        """
+        self.__resources = resources
+        self.__options = options
+        self.__muted = muted
+        # Channels for each effect, and which of them to use next
+        self.__channels = {}
+        self.__next = {}
+        # The Sound objects volume was last set on, per effect
+        self.__sounds = {}
+        self.__pending = set()
+        self.__reserved = 0
+        if not muted:
+            for key in Effects.settings:
+                self.__reserve(key)
+
+    def play(self, key):
+        """
+        Asks for an effect to be played at the end of this tick. Does nothing
+        if sound effects are turned off in the options.
+        """
+        if self.__options.sound and not self.__muted:
+            self.__pending.add(key)
+
+    def flush(self):
+        """
+        Plays every effect asked for since the last flush, once each. If all
+        voices of an effect are busy, the one started longest ago is cut off.
+        """
+        for key in self.__pending:
+            if key not in self.__channels:
+                self.__reserve(key)
+            sound = self.__get_sound(key)
+            channels = self.__channels[key]
+            start = self.__next[key]
+            voice = start
+            for i in range(len(channels)):
+                index = (start + i) % len(channels)
+                if not channels[index].get_busy():
+                    voice = index
+                    break
+            channels[voice].play(sound)
+            self.__next[key] = (voice + 1) % len(channels)
+        self.__pending.clear()
+
+    def __get_sound(self, key):
+        """
+        The volume is set on the Sound object itself, and only once. The
+        resource cache may have replaced the object since, though.
+        """
+        sound = self.__resources.get_sound(key)
+        if self.__sounds.get(key) is not sound:
+            (volume, _) = Effects.settings.get(key, Effects.default)
+            sound.set_volume(volume)
+            self.__sounds[key] = sound
+        return sound
+
+    def __reserve(self, key):
+        """
+        Reserves channels for an effect, so that Sound.play() elsewhere never
+        picks any of them
+        """
+        (_, voices) = Effects.settings.get(key, Effects.default)
+        first = self.__reserved
+        self.__reserved += voices
+        if pygame.mixer.get_num_channels() < self.__reserved:
+            pygame.mixer.set_num_channels(self.__reserved)
+        pygame.mixer.set_reserved(self.__reserved)
+        channels = range(first, self.__reserved)
+        self.__channels[key] = [Channel(i) for i in channels]
+        self.__next[key] = 0
@@ -0,0 +1,296 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Environment.py
+#
+# The game as an environment for agents that learn to play it, with reset()
+# and step() like in Gym, and a vector of such environments that are stepped
+# in processes of their own.
+#
+
+import os
+from math import hypot
+from multiprocessing import Pipe, Process
+from multiprocessing.sharedctypes import RawArray
+
+import pygame
+from pygame.event import clear
+from numpy import float32, uint8, frombuffer, zeros
+
+from Common import RUNNING, CLEARED, DIED, GAME_SIZE
+from Graphics import Graphics
+from Level import level_convert
+from Logic import GameLogic
+from Options import Options
+from Replay import UP, DOWN, LEFT, RIGHT, FIRE, LAST_SHIFT
+from Resources import Resources
+
+def make_actions():
+    """
+    Every direction the ship can move in, or none, with and without firing,
+    as input bits for GameLogic.set_input. The arrow named last in a
+    direction is the one pressed last.
+    """
+    directions = [[], [UP], [DOWN], [LEFT], [RIGHT], [UP, LEFT], [UP, RIGHT],
+                  [DOWN, LEFT], [DOWN, RIGHT]]
+    actions = []
+    for fire in [0, FIRE]:
+        for arrows in directions:
+            bits = sum(arrows) | fire
+            if len(arrows) > 0:
+                last = [UP, DOWN, LEFT, RIGHT].index(arrows[-1])
+                bits |= last << LAST_SHIFT
+            actions.append(bits)
+    return actions
+
+ACTIONS = make_actions()
+
+# Rewards, per enemy destroyed, per point of damage taken and at the end
+KILL_REWARD = 1.0
+DAMAGE_REWARD = -1.0
+CLEARED_REWARD = 10.0
+DIED_REWARD = -10.0
+
+# Features: one row for the player, with position, lives and power, then one
+# row for each of the nearest things, with kind, position and velocity
+ENTITIES = 32
+ENEMY, ENEMY_SHOT, ITEM = 1, 2, 3
+FEATURE_SHAPE = (ENTITIES + 1, 5)
+PIXEL_SHAPE = GAME_SIZE + (3,)
+
+class GameEnv:
+    """
+    A level of the game that an agent plays one tick at a time. An action is
+    an index into ACTIONS. The observation is either the game area of the
+    screen, or the player and the things nearest to it as an array of
+    features, see FEATURE_SHAPE. Features do not need the game to be painted,
+    so they are much faster to step.
+
+    Pixels are a view of the screen itself, with x as the first axis, and are
+    not copied. The view locks the screen, and is only valid until the next
+    step, so it has to be copied or dropped before then.
+    """
+
+    def __init__(self, level = 0, observation = 'features', max_ticks = 20000,
+                 display = False):
+        """
+        Without a display, the SDL dummy drivers are used, which only works if
+        pygame has not set up a display already.
+        """
+        if observation not in ['pixels', 'features']:
+            raise ValueError("Unknown observation: %s" % observation)
+        if not display:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        pygame.init()
+        options = Options()
+        options.music = False
+        options.sfx = False
+        resources = Resources(None)
+        self.__graphics = Graphics(resources, options, 32)
+        resources.preload_all()
+        render = observation == 'pixels'
+        self.__logic = GameLogic(self.__graphics, resources, options, None,
+                                 render)
+        self.__level = level
+        self.__observation = observation
+        self.__max_ticks = max_ticks
+        self.__ticks = 0
+        self.__kills = 0
+        self.__damage = 0
+
+    def reset(self, seed = None):
+        """
+        Starts the level over with a new player, and returns the first
+        observation. The game has no randomness, so the seed is not used.
+        """
+        logic = self.__logic
+        # Shots and deaths of the last game must not turn up in this one
+        clear()
+        logic.add_player()
+        logic.clear()
+        self.__graphics.reset_distance()
+        self.__graphics.set_scroll(5)
+        logic.set_level(level_convert()[self.__level])
+        self.__ticks = 0
+        self.__kills = 0
+        self.__damage = 0
+        if self.__observation == 'pixels':
+            self.__graphics.paint_bg()
+        return self.observe()
+
+    def step(self, action):
+        """
+        Runs one tick with the input of the given action. Returns the
+        observation, the reward, whether the game is over and a dictionary
+        with the state of the game.
+        """
+        logic = self.__logic
+        if self.__graphics.surface.get_locked():
+            raise ValueError("The last observation still locks the screen")
+        logic.set_input(ACTIONS[action])
+        stepped = logic.step()
+        self.__ticks += 1
+        player = logic.get_player()
+        kills, damage = logic.get_kills(), player.damage_taken
+        reward = (KILL_REWARD * (kills - self.__kills) +
+                  DAMAGE_REWARD * (damage - self.__damage))
+        self.__kills, self.__damage = kills, damage
+
+        state = logic.get_state()
+        if state == CLEARED:
+            reward += CLEARED_REWARD
+        elif state == DIED:
+            reward += DIED_REWARD
+        done = (not stepped or state != RUNNING or
+                self.__ticks >= self.__max_ticks)
+        info = { 'state' : state
+               , 'ticks' : self.__ticks
+               , 'lives' : player.lives
+               , 'kills' : kills
+               }
+        return (self.observe(), reward, done, info)
+
+    def observe(self):
+        if self.__observation == 'pixels':
+            return pygame.surfarray.pixels3d(self.__graphics.surface)
+        return features(self.__logic)
+
+    def get_observation_shape(self):
+        if self.__observation == 'pixels':
+            return PIXEL_SHAPE
+        return FEATURE_SHAPE
+
+    def get_action_count(self):
+        return len(ACTIONS)
+
+def features(logic):
+    """
+    The player and the ENTITIES enemies, enemy shots and items nearest to it,
+    as a float array of FEATURE_SHAPE. Rows of things that are not there are
+    all zeros.
+    """
+    result = zeros(FEATURE_SHAPE, float32)
+    player = logic.get_player()
+    (px, py) = player.get_position()
+    result[0] = (px, py, player.lives, player.power, 1)
+    rows = []
+    for (kind, group) in [(ENEMY, logic.get_enemies()),
+                          (ENEMY_SHOT, logic.get_enemy_shots()),
+                          (ITEM, logic.get_items())]:
+        for sprite in group:
+            (x, y) = sprite.get_position()
+            (dx, dy) = sprite.get_direction()
+            rows.append((kind, x, y, dx * sprite.speed, dy * sprite.speed))
+    rows.sort(key = lambda row: hypot(row[1] - px, row[2] - py))
+    for (i, row) in enumerate(rows[:ENTITIES]):
+        result[i + 1] = row
+    return result
+
+class VectorEnv:
+    """
+    A number of GameEnvs, each in a process of its own, stepped together.
+    The observations are written by the processes straight into one block of
+    shared memory, so they are never pickled, and are returned as one array
+    with an environment per row. The array is overwritten by the next step.
+    An environment whose game is over is reset right away, and the info of
+    its last tick has the last observation under 'final_observation'.
+
+    The processes are forked, so this has to be made before pygame has set
+    up a display in the parent process.
+    """
+
+    def __init__(self, count, **kwargs):
+        observation = kwargs.get('observation', 'features')
+        if observation == 'pixels':
+            (shape, dtype, code) = (PIXEL_SHAPE, uint8, 'B')
+        else:
+            (shape, dtype, code) = (FEATURE_SHAPE, float32, 'f')
+        size = 1
+        for length in shape:
+            size *= length
+        self.__buffer = RawArray(code, count * size)
+        self.__observations = frombuffer(self.__buffer, dtype).reshape(
+            (count,) + shape)
+        self.__pipes = []
+        self.__processes = []
+        for index in range(count):
+            (parent, child) = Pipe()
+            process = Process(target = work, args = (child, self.__buffer,
+                              index, shape, dtype, kwargs))
+            process.daemon = True
+            process.start()
+            child.close()
+            self.__pipes.append(parent)
+            self.__processes.append(process)
+
+    def __len__(self):
+        return len(self.__pipes)
+
+    def reset(self, seeds = None):
+        for (index, pipe) in enumerate(self.__pipes):
+            pipe.send(('reset', seeds[index] if seeds else None))
+        for pipe in self.__pipes:
+            pipe.recv()
+        return self.__observations
+
+    def step(self, actions):
+        """
+        Steps every environment with its action, in parallel. Returns the
+        observations, and lists of the rewards, whether each game was over and
+        the infos.
+        """
+        for (pipe, action) in zip(self.__pipes, actions):
+            pipe.send(('step', int(action)))
+        results = [pipe.recv() for pipe in self.__pipes]
+        (rewards, dones, infos) = zip(*results)
+        return (self.__observations, list(rewards), list(dones), list(infos))
+
+    def close(self):
+        for pipe in self.__pipes:
+            pipe.send(('close', None))
+        for process in self.__processes:
+            process.join()
+        self.__pipes = []
+        self.__processes = []
+
+def work(pipe, buffer, index, shape, dtype, kwargs):
+    """ Runs a GameEnv in a VectorEnv process, until told to close """
+    env = GameEnv(**kwargs)
+    observations = frombuffer(buffer, dtype).reshape((-1,) + shape)
+    mine = observations[index]
+    while True:
+        (command, argument) = pipe.recv()
+        if command == 'reset':
+            mine[...] = env.reset(argument)
+            pipe.send(None)
+        elif command == 'step':
+            (observation, reward, done, info) = env.step(argument)
+            if done:
+                info['final_observation'] = observation.copy()
+                # Let go of the screen before the reset paints it
+                del observation
+                observation = env.reset()
+            mine[...] = observation
+            del observation
+            pipe.send((reward, done, info))
+        elif command == 'close':
+            break
+    pipe.close()
@@ -19,62 +19,157 @@ whutshmup. If not, see <http://www.gnu.org/licenses/>.
 """
 
 from os.path import join
+from weakref import WeakKeyDictionary
 
 import pygame
 from pygame.font import SysFont
 from pygame.rect import Rect
+from pygame.transform import smoothscale
 
-from Common import WINDOW_SIZE, GAME_WIDTH, GFX_PATH
+from Common import WINDOW_SIZE, GAME_SIZE, GFX_PATH
+from Resources import scale_size
+from VecSprite import ORIGINS
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 GREEN = (0, 255, 0)
 GRAY  = (64, 64, 64)
 
+# Most rotated images to keep scaled at once, see Graphics.scaled. They are
+# not counted by the resources, so only a few are kept, and none between
+# levels.
+ROTATIONS_MAX = 200
+
 class Graphics:
     """
     This class has two purposes. It keeps track of the window and its surfaces,
     and it is used to draw stuff onto said surfaces.
+
+    The window may be of any size. Everything is laid out as in a window of
+    WINDOW_SIZE, scaled as much as fits, and the game field is in the middle
+    with the panels on each side taking up the rest of the width. The game
+    itself goes on at GAME_SIZE whatever the scale, and what is painted is
+    scaled by scaled() and place().
     """
 
-    def __init__(self, resources, options):
+    def __init__(self, resources, options, depth = 0):
+        """
+        The window gets the same pixel depth as the desktop, unless a depth is
+        given. Headless drivers would otherwise give an 8 bit window.
+        """
         self.__resources = resources
         
         args = pygame.DOUBLEBUF 
         if options.fullscreen:
             args |= pygame.FULLSCREEN
-        self.__window = pygame.display.set_mode(WINDOW_SIZE, args)
+        (width, height) = options.resolution
+        self.__window = pygame.display.set_mode((width, height), args, depth)
         pygame.display.set_caption("Whutshmup?!")
 
-        side_width = (WINDOW_SIZE[0] - GAME_WIDTH) / 2
-        self.__game_rect = Rect((side_width, 0), (GAME_WIDTH, WINDOW_SIZE[1]))
-        self.__left_rect = Rect((0, 0), (side_width, WINDOW_SIZE[1])),
-        self.__right_rect = Rect((GAME_WIDTH + side_width, 0), 
-                                 (side_width, WINDOW_SIZE[1])
+        scale = min(width / float(WINDOW_SIZE[0]),
+                    height / float(WINDOW_SIZE[1]))
+        self.__scale = scale
+        # Where the layout at scale 1 starts, to center it in the window
+        self.__origin = ((width - int(WINDOW_SIZE[0] * scale)) // 2,
+                         (height - int(WINDOW_SIZE[1] * scale)) // 2)
+        (game_width, game_height) = scale_size(GAME_SIZE, scale)
+        side_width = (width - game_width) // 2
+        game_top = (height - game_height) // 2
+        self.__game_rect = Rect((side_width, game_top),
+                                (game_width, game_height))
+        self.__left_rect = Rect((0, 0), (side_width, height))
+        self.__right_rect = Rect((game_width + side_width, 0), 
+                                 (width - game_width - side_width, height)
                                 )
         self.surface = self.__window.subsurface(self.__game_rect)
         self.left = self.__window.subsurface(self.__left_rect)
         self.right = self.__window.subsurface(self.__right_rect)
+        # Images scaled while painting, by the image at scale 1, and rotated
+        # images by the image and angle they were rotated from
+        resources.set_scale(scale)
+        self.__scaled = WeakKeyDictionary()
+        self.__rotations = {}
 
         self.__scrolling_speed = 0
         self.__current_scroll = 0
         self.__total_distance = 0
 
         # Fonts
-        self.__large = SysFont("Monospace", 40, True)
-        self.__small = SysFont("Monospace", 20, True)
-        self.__smaller = SysFont("Monospace", 12, True)
+        self.__large = SysFont("Monospace", int(40 * scale), True)
+        self.__small = SysFont("Monospace", int(20 * scale), True)
+        self.__smaller = SysFont("Monospace", int(12 * scale), True)
+        self.__tiny = SysFont("Monospace", int(10 * scale))
+
+        # Rendered text for the profiler overlay
+        self.__profile = None
+        # Rendered text of the panels by string, when it is cached, see
+        # set_cached_text
+        self.__texts = None
 
         # TODO: Different backgrounds for different levels
         bgimg = join(GFX_PATH, "BG-bluepattern.png")
-        self.__bg_img = self.__resources.get_graphics(bgimg)
+        self.__bg_img = self.__resources.get_scaled(bgimg)
         self.paint_bg()
     
     def get_width(self):
-        return self.__game_rect.width
+        return GAME_SIZE[0]
     
     def get_height(self):
-        return self.__game_rect.height
+        return GAME_SIZE[1]
+
+    def get_scale(self):
+        """ How many pixels of the window there are to a pixel of the game """
+        return self.__scale
+
+    def scaled(self, image):
+        """
+        An image of the game as it is painted in the window. Images of the
+        resources are scaled when loaded, and rotated ones are rotated from
+        those, see VecSprite.ORIGINS. Any other image is scaled here, once.
+        """
+        if self.__scale == 1:
+            return image
+        result = self.__scaled.get(image)
+        if result is None:
+            result = self.__resources.get_scaled_image(image)
+        if result is None:
+            origin = ORIGINS.get(image)
+            if origin is not None:
+                result = self.__rotations.get(origin)
+                if result is None:
+                    if len(self.__rotations) >= ROTATIONS_MAX:
+                        self.__rotations.clear()
+                    (base, angle) = origin
+                    result = pygame.transform.rotate(self.scaled(base), -angle)
+                    self.__rotations[origin] = result
+            else:
+                size = scale_size(image.get_size(), self.__scale)
+                result = smoothscale(image, size)
+            self.__scaled[image] = result
+        return result
+
+    def forget_rotations(self):
+        """ Lets go of the rotated images scaled so far """
+        self.__rotations.clear()
+
+    def place(self, position):
+        """ Where a position in the game is in the game field of the window """
+        scale = self.__scale
+        return (int(position[0] * scale), int(position[1] * scale))
+
+    def __at(self, x, y):
+        """ Where a position in a window of WINDOW_SIZE is in this window """
+        (left, top) = self.__origin
+        return (left + int(x * self.__scale), top + int(y * self.__scale))
+
+    def __panel_at(self, x, y):
+        """ Where a position in a panel at scale 1 is in the panels """
+        return (int(x * self.__scale), self.__at(0, y)[1])
+
+    def __centered(self, image, y):
+        """ Where to put an image centered at the given height """
+        (x, y) = self.__at(WINDOW_SIZE[0] // 2, y)
+        return (x - image.get_width() // 2, y)
     
     def get_total_distance(self):
         return self.__total_distance
@@ -83,12 +178,25 @@ class Graphics:
         self.__total_distance = 0
         self.__current_scroll = 0
 
+    def get_scroll_record(self):
+        """ How far the game has scrolled, and how fast, see set_scroll_record """
+        return (self.__scrolling_speed, self.__current_scroll,
+                self.__total_distance)
+
+    def set_scroll_record(self, record):
+        (self.__scrolling_speed, self.__current_scroll,
+         self.__total_distance) = record
+
     def set_scroll(self, speed):
         self.__scrolling_speed = speed
 
     def get_scroll(self):
         return self.__scrolling_speed
 
+    def get_current_scroll(self):
+        """ Where in the background image the game area starts """
+        return self.__current_scroll
+
     def scroll(self):
         self.__current_scroll += self.__scrolling_speed
         self.__current_scroll %= 1200
@@ -105,8 +213,23 @@ class Graphics:
 
         clear = self.__large.render("Level cleared!", True, WHITE)
         anykey = self.__small.render("Press any key to continue", True, WHITE)
-        self.__window.blit(clear, (250, 300))
-        self.__window.blit(anykey, (250, 350))
+        self.__window.blit(clear, self.__at(250, 300))
+        self.__window.blit(anykey, self.__at(250, 350))
+        flip()
+
+    def paint_paused(self):
+        """
+        Painted once when the game is paused, on top of the last game frame
+        """
+        trans_win = self.__window.copy()
+        trans_win.set_alpha(128)
+        trans_win.fill(BLACK)
+        self.__window.blit(trans_win, (0, 0))
+
+        paused = self.__large.render("Paused", True, WHITE)
+        key = self.__small.render("Press P to continue", True, WHITE)
+        self.__window.blit(paused, self.__at(250, 300))
+        self.__window.blit(key, self.__at(250, 350))
         flip()
 
     def paint_game_cleared(self):
@@ -114,21 +237,26 @@ class Graphics:
         goodjob = self.__large.render("Game cleared!", True, WHITE)
         key = self.__small.render("Congratulations! Press any key to continue", 
                                   True, WHITE)
-        self.__window.blit(goodjob, (250, 300))
-        self.__window.blit(key, (250, 350))
+        self.__window.blit(goodjob, self.__at(250, 300))
+        self.__window.blit(key, self.__at(250, 350))
         flip()
         
-    def paint_bg(self):
+    def paint_bg(self, scroll = None):
         """
         The background is a 600x1200px image that is tiled when the game
         scrolls. This currently works for that size, but should be generalized
-        to fit any images that can be tiled.
+        to fit any images that can be tiled. It is painted as scrolled as
+        given, or as it currently is.
         """
+        if scroll is None:
+            scroll = self.__current_scroll
         self.__window.fill(GRAY)
         self.surface.fill(BLACK)
-        srect = Rect(0, 1200 - self.__current_scroll, 600, 600)
+        (_, scroll) = self.place((0, scroll))
+        srect = self.surface.get_rect()
+        srect.top = self.__bg_img.get_height() - scroll
         self.surface.blit(self.__bg_img, (0, 0), srect)
-        self.surface.blit(self.__bg_img, (0, self.__current_scroll))
+        self.surface.blit(self.__bg_img, (0, scroll))
 
     # Paint the main menu 
     def main_menu(self, labels, active):
@@ -138,7 +266,7 @@ class Graphics:
         self.__window.fill(BLACK)
         # Main header
         header = self.__large.render("Whutshmup?!", True, WHITE)
-        self.__window.blit(header, (250, 300))
+        self.__window.blit(header, self.__at(250, 300))
 
         # Then all alternatives
         yinx = 350
@@ -146,14 +274,14 @@ class Graphics:
             label = labels[i]
             if i == active:
                 value = self.__small.render(label, True, BLACK, GREEN)
-                self.__window.blit(value, (250, yinx))
+                self.__window.blit(value, self.__at(250, yinx))
             else:
                 value = self.__small.render(label, True, WHITE)
-                self.__window.blit(value, (250, yinx))
+                self.__window.blit(value, self.__at(250, yinx))
             yinx += 50
 
         who = self.__smaller.render("Code by Tobias Olausson 2013", True, WHITE)
-        self.__window.blit(who, (10, 10))
+        self.__window.blit(who, self.__at(10, 10))
         flip()
     
     def paint_instructions_keys(self):
@@ -161,9 +289,9 @@ class Graphics:
         Paints the instruction screen for what keys are default, together with a
         keyboard with these keys marked.
         """
-        keyboard = self.__resources.get_graphics(join(GFX_PATH,"keyboard.png"))
+        keyboard = self.__resources.get_scaled(join(GFX_PATH,"keyboard.png"))
         self.__window.fill(BLACK)
-        self.__window.blit(keyboard, (150, 200))
+        self.__window.blit(keyboard, self.__at(150, 200))
         theader = self.__large.render("Default controls", True, WHITE)
         tesc = self.__small.render("ESC to abort/quit", True, WHITE)
         treturn = self.__small.render("Return to accept/select", True, WHITE)
@@ -171,12 +299,12 @@ class Graphics:
         tspace = self.__small.render("Space to fire", True, WHITE)
         tback = self.__smaller.render("Left/Right for main menu/next", True, 
                                       WHITE)
-        self.__window.blit(theader, (400 - theader.get_width() / 2, 100))
-        self.__window.blit(tesc, (140, 175))
-        self.__window.blit(treturn, (450, 175))
-        self.__window.blit(tarrows, (500, 400))
-        self.__window.blit(tspace, (200, 400))
-        self.__window.blit(tback, (250, 550))
+        self.__window.blit(theader, self.__centered(theader, 100))
+        self.__window.blit(tesc, self.__at(140, 175))
+        self.__window.blit(treturn, self.__at(450, 175))
+        self.__window.blit(tarrows, self.__at(500, 400))
+        self.__window.blit(tspace, self.__at(200, 400))
+        self.__window.blit(tback, self.__at(250, 550))
 
         flip()
 
@@ -184,8 +312,8 @@ class Graphics:
         """
         Paints the instruction screen on how the player's ship works
         """
-        ship = self.__resources.get_graphics(join(GFX_PATH,"deltawing.png"))
-        hitbox = self.__resources.get_graphics(join(GFX_PATH,"hitbox.png"))
+        ship = self.__resources.get_scaled(join(GFX_PATH,"deltawing.png"))
+        hitbox = self.__resources.get_scaled(join(GFX_PATH,"hitbox.png"))
         theader = self.__large.render("The ship", True, WHITE)
         tinfo = self.__small.render("Modeled after JAS 39 Gripen", True, WHITE)
         tbox = self.__small.render("The red ellipse is the hitbox", True, WHITE)
@@ -193,12 +321,12 @@ class Graphics:
         # TODO: Info about larger hitbox for crashing and items
 
         self.__window.fill(BLACK)
-        self.__window.blit(ship, (250, 200))
-        self.__window.blit(tinfo, (150, 300))
-        self.__window.blit(hitbox, (400, 200))
-        self.__window.blit(theader, (400 - theader.get_width() / 2, 100))
-        self.__window.blit(tbox, (400, 450))
-        self.__window.blit(tback, (250, 550))
+        self.__window.blit(ship, self.__at(250, 200))
+        self.__window.blit(tinfo, self.__at(150, 300))
+        self.__window.blit(hitbox, self.__at(400, 200))
+        self.__window.blit(theader, self.__centered(theader, 100))
+        self.__window.blit(tbox, self.__at(400, 450))
+        self.__window.blit(tback, self.__at(250, 550))
 
         flip()
 
@@ -212,15 +340,15 @@ class Graphics:
         tback = self.__smaller.render("Left/Right for prev/main menu.", True, 
                                       WHITE)
         self.__window.fill(BLACK)
-        self.__window.blit(theader, (400 - theader.get_width() / 2, 100))
-        self.__window.blit(tback, (250, 550))
+        self.__window.blit(theader, self.__centered(theader, 100))
+        self.__window.blit(tback, self.__at(250, 550))
 
         x = y = 175
         for (title, enemy) in enemies:
-            enimg = rotate(self.__resources.get_graphics(enemy))
+            enimg = rotate(self.__resources.get_scaled(enemy))
             text = self.__small.render(title, True, WHITE)
-            self.__window.blit(text, (x, y))
-            self.__window.blit(enimg, (x, y+25))
+            self.__window.blit(text, self.__at(x, y))
+            self.__window.blit(enimg, self.__at(x, y+25))
             x += 150
             if x >= 600:
                 y += 200
@@ -237,22 +365,22 @@ class Graphics:
         self.__window.fill(BLACK)
 
         theader = self.__large.render("Options", True, WHITE)
-        self.__window.blit(theader, (400 - theader.get_width() / 2, 100))
+        self.__window.blit(theader, self.__centered(theader, 100))
 
         yinx = 200
         # First we take care of the keys
         for i in range(len(key_opts)):
             (label, val) = key_opts[i]
             rlabel = self.__small.render(label, True, WHITE)
-            self.__window.blit(rlabel, (250, yinx))
+            self.__window.blit(rlabel, self.__at(250, yinx))
             keyname = pygame.key.name(val)
             if i == active:
                 if not selected:
                     rval = self.__small.render(keyname, True, BLACK, GREEN)
-                    self.__window.blit(rval, (450, yinx))
+                    self.__window.blit(rval, self.__at(450, yinx))
             else:
                 rval = self.__small.render(keyname, True, WHITE)
-                self.__window.blit(rval, (450, yinx))
+                self.__window.blit(rval, self.__at(450, yinx))
             yinx += 25
         
         yinx += 25
@@ -262,13 +390,13 @@ class Graphics:
         for i in range(len(bool_opts)):
             (label, val) = bool_opts[i]
             rlabel = self.__small.render(label, True, WHITE)
-            self.__window.blit(rlabel, (250, yinx))
+            self.__window.blit(rlabel, self.__at(250, yinx))
             if i+j == active:
                 rval = self.__small.render(str(val), True, BLACK, GREEN)
-                self.__window.blit(rval, (450, yinx))
+                self.__window.blit(rval, self.__at(450, yinx))
             else: 
                 rval = self.__small.render(str(val), True, WHITE)
-                self.__window.blit(rval, (450, yinx))
+                self.__window.blit(rval, self.__at(450, yinx))
             yinx += 25
 
         flip()
@@ -281,31 +409,73 @@ class Graphics:
         self.__window.set_alpha(128)
         toobad = self.__large.render("GAME OVER", True, WHITE)
         tryagain = self.__small.render("Try again (y/n)?", True, WHITE)
-        self.__window.blit(toobad, (250, 300))
-        self.__window.blit(tryagain, (250, 350))
+        self.__window.blit(toobad, self.__at(250, 300))
+        self.__window.blit(tryagain, self.__at(250, 350))
         flip()
 
     # TODO: Use graphics
-    def paint_stats(self, ship):
+    def paint_stats(self, lives, power, distance):
         """
         Paints statistics about the ship and game to the left panel
         """
-        font = self.__smaller
-        lives = font.render("Lives: " + str(ship.get_lives()), True, WHITE)
-        power = font.render("Power: " + str(ship.get_power()), True, WHITE)
-        dist = font.render("Dist: " + str(self.__total_distance), True, WHITE)
-        rect = self.left.blit(lives, (10, 200))
-        rect = self.left.blit(power, (10, rect.bottom))
-        self.left.blit(dist, (10, rect.bottom))
+        if self.__texts is not None:
+            # The distance changes every frame, so only show it in hundreds
+            distance -= distance % 100
+        lives = self.__text("Lives: " + str(lives))
+        power = self.__text("Power: " + str(power))
+        dist = self.__text("Dist: " + str(distance))
+        (x, y) = self.__panel_at(10, 200)
+        rect = self.left.blit(lives, (x, y))
+        rect = self.left.blit(power, (x, rect.bottom))
+        self.left.blit(dist, (x, rect.bottom))
 
     # TODO: Use graphics
-    def paint_boss(self, boss):
+    def paint_boss(self, life):
         """
         Paints boss statistics to the right panel
         """
-        life = boss.max_damage - boss.get_damage()
-        boss = self.__smaller.render("Boss: " + str(life), True, WHITE)
-        self.right.blit(boss, (10, 100))
+        boss = self.__text("Boss: " + str(life))
+        self.right.blit(boss, self.__panel_at(10, 100))
+
+    def set_cached_text(self, cached):
+        """
+        Cached text is rendered without antialiasing, and only once for every
+        string, which is a lot faster than rendering it every frame
+        """
+        if cached != (self.__texts is not None):
+            self.__texts = {} if cached else None
+
+    def __text(self, text):
+        """ Renders text for the panels, or takes it from the cache if on """
+        texts = self.__texts
+        if texts is None:
+            return self.__smaller.render(text, True, WHITE)
+        if text not in texts:
+            if len(texts) >= 64:
+                texts.clear()
+            texts[text] = self.__smaller.render(text, False, WHITE)
+        return texts[text]
+
+    def set_profile(self, lines):
+        """
+        Renders the lines of the profiler overlay, so they can be painted by
+        paint_profile every frame until they are changed
+        """
+        font = self.__tiny
+        height = font.get_linesize()
+        self.__profile = pygame.Surface((self.right.get_width(), 
+                                         height * len(lines)))
+        self.__profile.fill(GRAY)
+        for i in range(len(lines)):
+            text = font.render(lines[i], False, WHITE)
+            self.__profile.blit(text, (2, i * height))
+
+    def paint_profile(self):
+        """
+        Paints the profiler overlay to the right panel, below the boss stats
+        """
+        if self.__profile is not None:
+            self.right.blit(self.__profile, self.__panel_at(0, 200))
 
 #
 # Functions below
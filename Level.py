@@ -19,10 +19,11 @@ whutshmup. If not, see <http://www.gnu.org/licenses/>.
 """
 
 from os.path import join
-import pygame
 import itertools
+import random
 
 from Common import GFX_PATH
+from Render import BLIT, CIRCLE
 from VecSprite import VecSprite
 from Alien import Scout, Alien, Bomber, Chopper, Sniper, Kamikaze
 from Alien import FirstBoss, SecondBoss, all_ships
@@ -34,8 +35,20 @@ from Alien import FirstBoss, SecondBoss, all_ships
 
 class Level(object):
     
-    def __init__(self, items):
+    def __init__(self, items, assets = None):
+        """
+        The manifest of a level holds the graphics and sounds used by anything
+        in it. It is derived from the items, but a level may also declare
+        extra assets of its own.
+        """
         self.__items = items
+        self.__manifest = set(assets or [])
+        for (_, work) in items:
+            for item in work:
+                self.__manifest.update(item['item'].assets)
+
+    def manifest(self):
+        return set(self.__manifest)
 
     # TODO: Include enemies
     def get(self, distance):
@@ -48,20 +61,164 @@ class Level(object):
             return x[1][0]['item'] == Barrier
 
         # We only need the actual items, so strip the distance
-        todo = map(lambda x: x[1], filter(lambda x: x[0] <= distance, self.__items))
-        self.__items = filter(lambda x: keep_barrier(x, distance), self.__items)
+        todo = [x[1] for x in self.__items if x[0] <= distance]
+        self.__items = [x for x in self.__items if keep_barrier(x, distance)]
         return todo
 
+    def upcoming(self, distance):
+        """
+        The kinds of items that are due up to the given distance, but have not
+        yet been added to the game
+        """
+        return set(item['item'] for (pos, work) in self.__items
+                   if pos <= distance for item in work)
+
     def scroll(self, distance):
         self.__items = [(pos + distance, i) for (pos, i) in self.__items]
 
     def pop(self, index):
         self.__items.pop(index)
 
+    def add(self, distance, items):
+        self.__items.append((distance, items))
+
+    def get_record(self):
+        """
+        What is left of the level. The items themselves are never changed, so
+        they are shared with the record rather than copied.
+        """
+        return list(self.__items)
+
+    def set_record(self, record):
+        self.__items = list(record)
+
     # Override
     def __len__(self):
         return len(self.__items)
 
+class EndlessLevel(Level):
+    """
+    A level that never ends. Waves of regular enemies are generated from a
+    seeded random source a little ahead of the current distance, so only a
+    bounded number of waves are ever kept in memory. The waves get harder the
+    further the player gets. The same seed always gives the same level.
+    """
+
+    # Enemy kinds, in the order they are introduced as difficulty ramps up
+    kinds = [Scout, Alien, Chopper, Kamikaze, Sniper, Bomber]
+
+    def __init__(self, seed = None, lookahead = 1200):
+        kinds = EndlessLevel.kinds + [Item]
+        assets = [asset for kind in kinds for asset in kind.assets]
+        super(EndlessLevel, self).__init__([], assets)
+        self.__random = random.Random(seed)
+        self.__lookahead = lookahead
+        self.__wave = 0
+        self.__next = 100
+        # Make sure there is something queued before the first tick, or the
+        # game would consider the level cleared straight away
+        self.__refill(0)
+
+    def get(self, distance):
+        self.__refill(distance)
+        return super(EndlessLevel, self).get(distance)
+
+    def scroll(self, distance):
+        super(EndlessLevel, self).scroll(distance)
+        self.__next += distance
+
+    def get_wave(self):
+        return self.__wave
+
+    def get_record(self):
+        """ Adds the random source and the next wave to the Level record """
+        return (super(EndlessLevel, self).get_record(),
+                self.__random.getstate(), self.__wave, self.__next)
+
+    def set_record(self, record):
+        (level, state, self.__wave, self.__next) = record
+        super(EndlessLevel, self).set_record(level)
+        self.__random.setstate(state)
+
+    def __refill(self, distance):
+        while self.__next <= distance + self.__lookahead:
+            self.__next = self.__add_wave(self.__next)
+
+    def __add_wave(self, distance):
+        """
+        Adds the next wave at the given distance and returns the distance at
+        which the wave after it should start.
+        """
+        rand = self.__random
+        tier = self.__wave // 5
+        self.__wave += 1
+
+        kinds = EndlessLevel.kinds[:min(2 + tier, len(EndlessLevel.kinds))]
+        kind = pick(rand, kinds)
+        count = min(2 + tier, 8)
+        speed = min(8 + tier, 14)
+        items = []
+
+        if kind == Scout or kind == Alien or kind == Chopper:
+            # A straight line of ships coming down the screen
+            xs = spread(rand, count, 50, 550)
+            for x in xs:
+                item = { 'item' : kind, 'pos' : (x, -100), 'speed' : speed }
+                if kind == Alien and tier > 0:
+                    item['strafe'] = pick(rand, [-45, 0, 45])
+                items.append(item)
+        elif kind == Kamikaze:
+            # Kamikazes come in from both upper corners
+            for i in range(count):
+                x = 0 if i % 2 == 0 else 600
+                items.append({ 'item' : kind, 'pos' : (x, -100 - 50 * i)
+                             , 'speed' : speed + 2 })
+        else:
+            # Snipers and bombers stop at a target and stay there, so they
+            # are followed by a barrier to keep them from piling up
+            count = min(1 + tier // 2, 4)
+            xs = spread(rand, count, 100, 500)
+            for x in xs:
+                target = (x, between(rand, 100, 200))
+                items.append({ 'item' : kind, 'pos' : (x, -100)
+                             , 'target' : target })
+
+        self.add(distance, items)
+
+        # Now and then, drop a crate with a power-up or an extra life
+        if rand.random() < 0.15:
+            item_type = Item.LIFE if rand.random() < 0.2 else Item.POWER
+            self.add(distance, [{ 'item' : Item, 'type' : item_type
+                                , 'pos' : (between(rand, 100, 500), -200)
+                                , 'value' : 1, 'speed' : 10 }])
+
+        gap = max(150, 400 - 25 * tier)
+        # Barriers have to be alone on their distance, and they keep the
+        # number of live enemies bounded when the player does not kill them
+        if kind in [Sniper, Bomber] or self.__wave % 4 == 0:
+            self.add(distance + gap // 2, [{ 'item' : Barrier }])
+        return distance + gap
+
+def spread(rand, count, low, high):
+    """
+    Returns count x coordinates between low and high, evenly spaced but with
+    some random jitter
+    """
+    step = (high - low) // count
+    return [low + step * i + between(rand, 0, step // 2) for i in range(count)]
+
+# Python 3 draws random integers and choices in another way than Python 2, so
+# the levels are made with these, which draw them the way Python 2 does. The
+# same seed then gives the same level on both.
+
+def between(rand, low, high):
+    """ A random integer from low to high, both included """
+    return low + int(rand.random() * (high - low + 1))
+
+def pick(rand, seq):
+    """ A random element of a sequence """
+    return seq[int(rand.random() * len(seq))]
+
 def level_convert():
     levs = get_levels()
     ret = []
@@ -136,6 +293,7 @@ class Barrier(VecSprite):
     """
     The barrier is the most ill-placed class in this whole game project
     """
+    assets = []
     blehe = "blaha"
 
 class Item(VecSprite):
@@ -149,6 +307,7 @@ class Item(VecSprite):
     crateimg = join(GFX_PATH,"crate.png")
     heartimg = join(GFX_PATH,"heart.png")
     levelimg = join(GFX_PATH,"powerup.png")
+    assets = [crateimg, heartimg, levelimg]
 
     # Item types
     LIFE = 1
@@ -157,7 +316,7 @@ class Item(VecSprite):
     types = [LIFE, POWER, MINE]
 
     def __init__(self, common, init_pos, init_dir, speed, item_type, value):
-        (self.surface, self.res, self.options) = common
+        (self.surface, self.res, self.options, _, _) = common
         img = self.res.get_graphics(Item.crateimg)
         super(Item, self).__init__(init_pos, init_dir, img, speed)
 
@@ -171,19 +330,37 @@ class Item(VecSprite):
         elif item_type == Item.POWER:
             self.__itemimage = self.res.get_graphics(Item.levelimg)
 
-    def blit(self):
+    def draw(self, ops):
         """
         Paint the item. If it is currently unboxing, draw a filled circle
         similar to the explosion animation. Otherwise, just blit the image.
         """
         if not self.boxed and self.boxcounter < 16:
-            radius = int(self.get_width() / 2 / (16.0 - self.boxcounter))
+            radius = int(self.get_width() // 2 / (16.0 - self.boxcounter))
             (x, y) = self.get_position()
             color = (255, 0, 0) # Red
-            pygame.draw.circle(self.surface, color, (int(x), int(y)), radius)
+            ops.append((CIRCLE, color, (int(x), int(y)), radius))
             self.boxcounter += 3
         else:
-            self.surface.blit(self.image, self.rect)
+            ops.append((BLIT, self.image, self.rect.topleft))
+
+    def get_record(self):
+        """ Adds the contents of the crate to the VecSprite record """
+        return (super(Item, self).get_record(), self.__type, self.__value,
+                self.boxed, self.boxcounter)
+
+    def set_record(self, record):
+        (sprite, self.__type, self.__value, self.boxed,
+         self.boxcounter) = record
+        crate = self.res.get_graphics(Item.crateimg)
+        self.__itemimage = None
+        if self.__type == Item.LIFE:
+            self.__itemimage = self.res.get_graphics(Item.heartimg)
+        elif self.__type == Item.POWER:
+            self.__itemimage = self.res.get_graphics(Item.levelimg)
+        # The mask of an unboxed item is still that of the crate
+        image = crate if self.boxed else self.__itemimage
+        super(Item, self).set_record(sprite, image, crate)
 
     def get_type(self):
         return self.__type
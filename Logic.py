@@ -17,15 +17,21 @@ You should have received a copy of the GNU General Public License along with
 whutshmup. If not, see <http://www.gnu.org/licenses/>.
 """
 
-from os.path import join
+from os import times
+from time import time
+from zlib import crc32
 
 import pygame
-from pygame.locals import QUIT, KEYDOWN, KEYUP
-from pygame.sprite import Group
+from pygame.locals import QUIT, KEYDOWN, KEYUP, USEREVENT
+from pygame.locals import ACTIVEEVENT, VIDEOEXPOSE
+from pygame.event import Event
+from pygame.rect import Rect
+from pygame.sprite import OrderedUpdates
 
-from Common import FRAMERATE, RUNNING, CLEARED, DIED, QUITGAME, ABORTED
+from Common import FRAMERATE, RUNNING, PAUSED, CLEARED, DIED, QUITGAME, ABORTED
+from Common import PAUSE_KEY, PROFILE_KEY, APPINPUTFOCUS, APPACTIVE
 from Common import ENEMY_FIRE, USER_FIRE, BOSS_ENTER, BOSS_EXIT, PLAYER_DIED
-from Common import SHIPSPEED, MP3_PATH
+from Common import BOSS_LOOKAHEAD, GAME_SIZE
 
 from Vec2d import Vec2d
 from Ship import Ship
@@ -33,8 +39,22 @@ from Level import Barrier, Item
 
 from Player import Player
 from Alien import Scout, Alien, Bomber, Sniper, Chopper, Kamikaze
-from Alien import FirstBoss, SecondBoss
+from Alien import Boss, FirstBoss, SecondBoss
 from Graphics import flip
+from Music import Music
+from Effects import Effects
+from Profiler import Profiler
+from Allocations import AllocationTracker
+from Collector import Collector
+from Quality import Governor
+from Render import Presenter, ThreadedPresenter
+from Render import BACKGROUND, STATS, BOSS, PROFILE, TEXT, SURFACES
+from Replay import UP, DOWN, LEFT, RIGHT, FIRE, ABORT, LAST_SHIFT
+from Snapshot import History, sprite_record, make_sprite
+from Snapshot import level_record, make_level
+
+# Events the game posts to itself, which are part of its state between ticks
+GAME_EVENTS = [USER_FIRE, ENEMY_FIRE, BOSS_ENTER, BOSS_EXIT, PLAYER_DIED]
 
 class GameLogic:
     """
@@ -47,36 +67,431 @@ class GameLogic:
     handling.
     """
 
-    def __init__(self, graphics, resources, options):
+    def __init__(self, graphics, resources, options, music = None,
+                 render = True):
+        """
+        A game that is not rendered is only simulated: nothing is painted or
+        played, and the game loop does not wait for the frame rate. Sprites
+        keep only what is needed for collisions. This is for testing levels
+        and benchmarks, which can run a whole level in a few seconds.
+        """
         self.__graphics = graphics
         self.__resources = resources
         self.__options = options
-        self.__common = (graphics.surface, resources, options)
+        self.__render = render
+        self.__music = music if render else None
+        self.__effects = Effects(resources, options, not render)
+        self.__common = (graphics.surface, resources, options, self.__effects,
+                         render)
         self.__ship = None
-        # Different groups to avoid friendly fire
-        self.__enemy_shots = Group() 
-        self.__player_shots = Group()
-        self.__enemies = Group() 
-        self.__explosions = Group()
-        self.__items = Group()
+        # Different groups to avoid friendly fire. They keep their sprites in
+        # the order they were added, unlike plain groups, so collisions are
+        # always handled in the same order and a replay goes like the original
+        self.__enemy_shots = OrderedUpdates()
+        self.__player_shots = OrderedUpdates()
+        self.__enemies = OrderedUpdates()
+        self.__explosions = OrderedUpdates()
+        self.__items = OrderedUpdates()
         self.__state = RUNNING
         self.__boss = None
         self.__keysdown = []
         self.__level = {}
+        self.__boss_music = False
+        # Enemies destroyed by the player since the level started
+        self.__kills = 0
+        self.__paused_time = 0
+        self.__paused_cpu = 0
+        # Frame profiling is off unless asked for, see enable_profiler
+        self.__profiler = None
+        self.__overlay = False
+        # Input is recorded into this, if set, see set_recording
+        self.__recording = None
+        # Allocation tracking is off unless asked for, see track_allocations
+        self.__allocations = None
+        # Garbage collection is left alone unless asked for, see schedule_gc
+        self.__collector = None
+        # Snapshots of the last ticks, if rewinding is on, see enable_rewind
+        self.__history = None
+        # The quality is kept as it is unless asked for, see enable_governor
+        self.__governor = None
+        # Frames are put on the screen right away unless asked for, see
+        # enable_render_thread
+        self.__presenter = Presenter(graphics)
 
     def game_loop(self):
         self.__state = RUNNING
         clock = pygame.time.Clock()
-        while self.__state == RUNNING: 
-            if self.has_won():
-                self.__state = CLEARED
-                break
-            self.handle_events()
-            self.tick()
+        # Without rendering there is no time left over to collect in
+        collector = self.__collector if self.__render else None
+        if collector: collector.begin_level()
+        while self.__state in [RUNNING, PAUSED]: 
+            if self.__state == PAUSED:
+                self.pause()
+                # Don't let the clock count the pause as a long frame
+                clock.tick()
+                continue
+            start = time()
+            if self.step() and self.__render:
+                elapsed = time() - start
+                if self.__governor:
+                    self.__governor.frame(elapsed)
+                if collector:
+                    collector.idle(1.0 / FRAMERATE - elapsed)
+                clock.tick(FRAMERATE)
+        # Whatever is painted after the game must not be painted over
+        self.__presenter.wait()
+        if collector: collector.end_level()
+        return self.__state
+
+    def step(self):
+        """
+        Runs a single frame of the game: handles events, ticks and paints.
+        Returns False, without doing any of that, if the level is cleared.
+        """
+        if self.has_won():
+            self.__state = CLEARED
+            return False
+        prof = self.__profiler
+        allocs = self.__allocations
+        if allocs: allocs.begin_frame()
+        if prof: prof.begin_frame()
+        self.handle_events()
+        if prof: prof.mark("events")
+        self.tick()
+        if self.__render:
             self.paint_stuff()
-            clock.tick(FRAMERATE)
+        else:
+            self.advance_explosions()
+            if prof: prof.mark("explode")
+        if prof: prof.end_frame()
+        if allocs: allocs.end_frame()
+        if self.__recording is not None:
+            self.__recording.record(self.get_input(), self.state_hash())
+        if self.__history is not None:
+            self.__history.push(self.snapshot())
+        return True
+
+    def get_state(self):
         return self.__state
 
+    def pause(self):
+        """
+        Nothing is updated or painted while the game is paused. An overlay is
+        painted once, and then the game just blocks waiting for events until
+        the player continues, aborts or closes the window.
+        """
+        # Keys may be released while we are not looking, so stop the ship
+        self.__keysdown = []
+        self.__ship.set_fire(False)
+        if not self.__ship.has_target():
+            self.__ship.speed = 0
+            self.__ship.strafe = 0
+        if self.__music is not None:
+            self.__music.pause()
+        pygame.mixer.pause()
+
+        self.__presenter.wait()
+        self.__graphics.paint_paused()
+        # Nothing else is going on while paused, so it is a good time for it
+        if self.__collector: self.__collector.collect()
+        cpu, wall = cpu_time(), time()
+        # Events from the game itself, such as shots being fired, have to wait
+        # until the game continues
+        postponed = []
+        opts = self.__options
+        while self.__state == PAUSED:
+            event = pygame.event.wait()
+            if event.type == QUIT:
+                self.__state = QUITGAME
+            elif event.type == KEYDOWN and event.key == opts.abort:
+                self.__state = ABORTED
+            elif event.type == KEYDOWN and event.key == PAUSE_KEY:
+                self.__state = RUNNING
+            elif event.type in [ACTIVEEVENT, VIDEOEXPOSE]:
+                # The window may have been restored, so show it again
+                flip()
+            elif event.type > USEREVENT:
+                postponed.append(event)
+        for event in postponed:
+            pygame.event.post(event)
+        self.__paused_cpu += cpu_time() - cpu
+        self.__paused_time += time() - wall
+
+        pygame.mixer.unpause()
+        if self.__music is not None:
+            self.__music.unpause()
+
+    def enable_profiler(self, overlay = True, window = 150):
+        """
+        Starts measuring how long each phase of a frame takes, over the last
+        window frames (or all of them if window is None). The results can be
+        shown in the right panel, or read from the returned Profiler.
+        """
+        self.__profiler = Profiler(window)
+        self.__overlay = overlay
+        return self.__profiler
+
+    def disable_profiler(self):
+        self.__profiler = None
+        self.__overlay = False
+
+    def get_profiler(self):
+        return self.__profiler
+
+    def schedule_gc(self, budget, limit = 20000):
+        """
+        From the next game loop on, garbage is only collected at the end of
+        frames, in the time left before the next frame. See Collector.
+        """
+        self.__collector = Collector(budget, limit)
+        return self.__collector
+
+    def unschedule_gc(self):
+        self.__collector = None
+
+    def get_collector(self):
+        return self.__collector
+
+    def enable_governor(self, budget = 1.0 / FRAMERATE):
+        """
+        From the next game loop on, the graphics are made cheaper when frames
+        take longer than the budget in seconds, see Quality.Governor
+        """
+        self.__governor = Governor(budget)
+        return self.__governor
+
+    def disable_governor(self):
+        self.__governor = None
+        self.__presenter.wait()
+        self.__graphics.set_cached_text(False)
+
+    def get_governor(self):
+        return self.__governor
+
+    def enable_render_thread(self):
+        """
+        Frames are painted and put on the screen in a thread of their own,
+        while the next frame is simulated, see Render.ThreadedPresenter
+        """
+        if not self.__presenter.is_threaded():
+            self.__presenter = ThreadedPresenter(self.__graphics)
+        return self.__presenter
+
+    def disable_render_thread(self):
+        self.__presenter.stop()
+        self.__presenter = Presenter(self.__graphics)
+
+    def get_presenter(self):
+        return self.__presenter
+
+    def track_allocations(self, top = 15, depth = 4, interval = 1):
+        """
+        Starts recording the allocations and the garbage collections of every
+        frame, which makes the game a lot slower. See AllocationTracker.
+        """
+        self.untrack_allocations()
+        self.__allocations = AllocationTracker(top, depth, interval)
+        self.__allocations.start()
+        return self.__allocations
+
+    def untrack_allocations(self):
+        """ Stops tracking allocations, returns the tracker if there was one """
+        tracker = self.__allocations
+        if tracker is not None:
+            tracker.stop()
+        self.__allocations = None
+        return tracker
+
+    def set_recording(self, recording):
+        """
+        Records the input and a hash of the state of every tick from now on
+        into the given Replay.Recording. None stops recording.
+        """
+        self.__recording = recording
+
+    def get_input(self):
+        """
+        The input of the player in the current tick, as a bit field of held
+        keys. It also holds which arrow was pressed last, since that decides
+        the direction of the ship when more than two arrows are held.
+        """
+        opts = self.__options
+        arrows = [opts.up, opts.down, opts.left, opts.right]
+        bits = 0
+        for (key, bit) in zip(arrows, [UP, DOWN, LEFT, RIGHT]):
+            if key in self.__keysdown:
+                bits |= bit
+        if len(self.__keysdown) > 0:
+            bits |= arrows.index(self.__keysdown[-1]) << LAST_SHIFT
+        if self.__ship.is_firing():
+            bits |= FIRE
+        if self.__state == ABORTED:
+            bits |= ABORT
+        return bits
+
+    def set_input(self, bits):
+        """
+        Gives input the way get_input() returns it, through the same calls as
+        when the keys are pressed and released. Used to replay recorded input.
+        """
+        opts = self.__options
+        arrows = [opts.up, opts.down, opts.left, opts.right]
+        held = [key for (key, bit) in zip(arrows, [UP, DOWN, LEFT, RIGHT])
+                if bits & bit]
+        for key in list(self.__keysdown):
+            if key not in held:
+                self.__keysdown.remove(key)
+                self.arrow_released(self.__keysdown)
+        pressed = [key for key in held if key not in self.__keysdown]
+        # The arrow pressed last has to be pressed last here too
+        last = arrows[bits >> LAST_SHIFT]
+        if last in pressed:
+            pressed.remove(last)
+            pressed.append(last)
+        for key in pressed:
+            self.arrow_pressed(key, self.__keysdown)
+            self.__keysdown.append(key)
+
+        if bits & FIRE and not self.__ship.is_firing():
+            self.start_fire()
+        elif not bits & FIRE and self.__ship.is_firing():
+            self.stop_fire()
+        if bits & ABORT:
+            self.__state = ABORTED
+
+    def state_hash(self):
+        """
+        A checksum of everything in the game, to tell whether two runs of it
+        went the same way. Sprite groups have no order, so they are sorted.
+        """
+        ship = self.__ship
+        state = [self.__state, self.__graphics.get_total_distance(),
+                 ship.get_position(), ship.lives, ship.power,
+                 (ship.strafe.x, ship.strafe.y)]
+        for group in [self.__enemies, self.__explosions, self.__enemy_shots,
+                      self.__player_shots, self.__items]:
+            state.append(sorted((type(sprite).__name__, sprite.get_position())
+                                for sprite in group))
+        return crc32(repr(state).encode()) & 0xffffffff
+
+    def snapshot(self):
+        """
+        The whole state of the game between two ticks, as plain records: the
+        player, every sprite, what is left of the level, how far the game has
+        scrolled, and the events the game has posted to itself but not yet
+        handled. Images are not part of it. See restore().
+        """
+        groups = [self.__enemies, self.__explosions, self.__enemy_shots,
+                  self.__player_shots, self.__items]
+        # The events have to be taken off the queue to be seen, so put them
+        # all back the way they were
+        queued = pygame.event.get()
+        for event in queued:
+            pygame.event.post(event)
+        events = []
+        for event in queued:
+            if event.type in [USER_FIRE, ENEMY_FIRE]:
+                events.append((event.type, sprite_record(event.shot)))
+            elif event.type == BOSS_ENTER:
+                events.append((event.type, self.__find(event.ship)))
+            elif event.type in GAME_EVENTS:
+                events.append((event.type, None))
+        return (self.__state, list(self.__keysdown), self.__find(self.__boss),
+                self.__boss_music, self.__kills,
+                self.__graphics.get_scroll_record(),
+                level_record(self.__level), self.__ship.get_record(),
+                [[sprite_record(sprite) for sprite in group]
+                 for group in groups], events)
+
+    def restore(self, snapshot):
+        """
+        Puts the game back the way it was when the snapshot was taken. The
+        sprites are made anew, but the player is kept and put back in place.
+        The same snapshot can be restored any number of times, in any game
+        with the same resources.
+        """
+        (self.__state, keysdown, boss, self.__boss_music, self.__kills,
+         scroll, level, player, groups, events) = snapshot
+        self.__keysdown = list(keysdown)
+        self.__graphics.set_scroll_record(scroll)
+        self.__level = make_level(level)
+        ship = self.__ship
+        ship.set_record(player)
+        common = self.__common
+        for (group, records) in zip([self.__enemies, self.__explosions,
+                                     self.__enemy_shots, self.__player_shots,
+                                     self.__items], groups):
+            group.empty()
+            for record in records:
+                group.add(make_sprite(common, ship, record))
+        self.__boss = self.__lookup(boss)
+
+        pygame.event.clear(GAME_EVENTS)
+        for (kind, value) in events:
+            if kind in [USER_FIRE, ENEMY_FIRE]:
+                pygame.event.post(Event(kind,
+                                        shot = make_sprite(common, ship, value)))
+            elif kind == BOSS_ENTER:
+                boss = self.__lookup(value)
+                if boss is not None:
+                    pygame.event.post(Event(kind, ship = boss))
+            else:
+                pygame.event.post(Event(kind))
+
+    def __find(self, ship):
+        """ Where an enemy is, as its group and index in it, or None """
+        for (i, group) in enumerate([self.__enemies, self.__explosions]):
+            for (j, sprite) in enumerate(group):
+                if sprite is ship:
+                    return (i, j)
+        return None
+
+    def __lookup(self, where):
+        if where is None:
+            return None
+        (i, j) = where
+        return [self.__enemies, self.__explosions][i].sprites()[j]
+
+    def enable_rewind(self, ticks = FRAMERATE * 5):
+        """
+        Takes a snapshot after every tick, and keeps the given number of them,
+        so the game can be wound back with rewind()
+        """
+        self.__history = History(ticks)
+
+    def disable_rewind(self):
+        self.__history = None
+
+    def rewind(self, ticks):
+        """
+        Winds the game back by the given number of ticks, or as far as it can.
+        Returns False if there was nothing to wind back to.
+        """
+        if self.__history is None:
+            return False
+        snapshot = self.__history.back(ticks)
+        if snapshot is None:
+            return False
+        self.restore(snapshot)
+        return True
+
+    def get_counts(self):
+        """ The number of sprites of each kind in the game """
+        return { 'enemies' : len(self.__enemies)
+               , 'explosions' : len(self.__explosions)
+               , 'enemy_shots' : len(self.__enemy_shots)
+               , 'player_shots' : len(self.__player_shots)
+               , 'items' : len(self.__items)
+               }
+
+    def get_pause_stats(self):
+        """
+        The wall clock and CPU time spent waiting while paused, in seconds. The
+        CPU time should be close to zero.
+        """
+        return { 'paused_s' : self.__paused_time
+               , 'paused_cpu_s' : self.__paused_cpu }
+
     def has_won(self):
         return self.is_alive() and len(self.__level) == 0 and len(self.__enemies.sprites()) == 0 and len(self.__explosions.sprites()) == 0 and len(self.__enemy_shots.sprites()) == 0
 
@@ -92,9 +507,12 @@ class GameLogic:
         self.__player_shots.empty()
         self.__enemies.empty()
         self.__explosions.empty()
+        self.__items.empty()
         self.__level = {}
         self.__keysdown = []
         self.__boss = None
+        self.__boss_music = False
+        self.__kills = 0
         self.__ship.set_fire(False)
         self.__ship.set_strafe(0)
         self.__ship.speed = 0
@@ -102,11 +520,12 @@ class GameLogic:
 
     def set_level(self, level):
         self.__level = level
+        self.__boss_music = False
 
     # Add a player ship
     def add_player(self):
         direction = (0, -1) # North
-        common = (self.__graphics.surface, self.__resources, self.__options)
+        common = self.__common
         (x, y) = common[0].get_rect().centerx, common[0].get_rect().bottom - 50
         self.__ship = Player(common, (x, y), direction, 0)
 
@@ -126,6 +545,15 @@ class GameLogic:
     
     def get_enemies(self):
         return self.__enemies
+
+    def get_enemy_shots(self):
+        return self.__enemy_shots
+
+    def get_items(self):
+        return self.__items
+
+    def get_kills(self):
+        return self.__kills
     
     # Handles events generated by the user pressing the arrow keys.
     # TODO: Holding Left, Down and Right makes the ship go forward
@@ -134,7 +562,7 @@ class GameLogic:
         if not self.__ship.has_target():
             opts = self.__options
             arrows = [opts.up, opts.down, opts.left, opts.right]
-            arrows_pressed = filter(lambda x: x in keysdown, arrows)
+            arrows_pressed = [x for x in arrows if x in keysdown]
             last_pressed = None
             if len(arrows_pressed) > 0:
                 last_pressed = arrows_pressed.pop()
@@ -154,19 +582,22 @@ class GameLogic:
                 strafe_total = strafe_1 + strafe_2
                 self.__ship.strafe = strafe_total.get_angle()
 
-            self.__ship.speed = SHIPSPEED
+            self.__ship.speed = self.__options.shipspeed
 
     # Handles events generated when a held arrow is released
     def arrow_released(self, pressed_keys):
         if not self.__ship.has_target():
             opts = self.__options
-            arrows = set([opts.up, opts.down, opts.left, opts.right])
-            pressed_arr = arrows & set(pressed_keys)
+            # The arrow to go on with is picked in this order, which is the
+            # order a set of the default keys used to pop them in. Popping a
+            # set depends on the key codes, which pygame 2 has changed.
+            arrows = [opts.up, opts.down, opts.right, opts.left]
+            pressed_arr = [key for key in arrows if key in pressed_keys]
             if len(pressed_arr) == 0: 
                 self.__ship.speed = 0
                 self.__ship.strafe = 0 # No strafe
             else:
-                latest = pressed_arr.pop()
+                latest = pressed_arr[0]
                 # Remove the latest pressed button temporarily
                 pressed_fake = [k for k in pressed_keys if k != latest]
                 # There are other arrows still pressed, so we need to
@@ -195,7 +626,8 @@ class GameLogic:
         enemy_shots = self.__enemy_shots
         player_shots = self.__player_shots
         items = self.__items
-        screen = self.__graphics.surface.get_rect()
+        screen = Rect((0, 0), GAME_SIZE)
+        prof = self.__profiler
         
         # First, see if the player was shot, and in that case - do something!
         if len(enemy_shots.sprites()) > 0:
@@ -208,6 +640,8 @@ class GameLogic:
             for shot in ship_shot:
                 player.add_damage(shot.get_damage())
 
+        if prof: prof.mark("col1")
+
         # Second, see if any enemies were shot by the player (or by themselves)
         if len(enemies.sprites()) > 0 and len(player_shots.sprites()) > 0:
             enemies_shot = pygame.sprite.groupcollide(
@@ -222,11 +656,14 @@ class GameLogic:
                 for shot in shots:
                     enemy.add_damage(shot.get_damage())
         
+        if prof: prof.mark("col2")
+
         # Before step three and four, we want to use the whole ship as hitbox,
         # so we need to set its mask to its original state. This will be
         # changed back later.
         oldmask = player.mask.scale(player.mask.get_size())
-        player.mask = pygame.mask.from_surface(player.image)
+        with SURFACES:
+            player.mask = pygame.mask.from_surface(player.image)
 
         # Third, see if any enemies were hit by the player's ship
         if len(enemies.sprites()) > 0:
@@ -240,6 +677,8 @@ class GameLogic:
                 player.add_damage(max(0, enemy.max_damage - enemy.get_damage()))
                 enemy.add_damage(5)
 
+        if prof: prof.mark("col3")
+
         # Fourth: See if any items was hit by the ship
         if len(items.sprites()) > 0:
             item_collide = pygame.sprite.spritecollide(
@@ -259,6 +698,8 @@ class GameLogic:
                         player.power += item.get_value()
                     item.kill()
 
+        if prof: prof.mark("col4")
+
         # Fourth and a half: See if any items was shot by the ship
         if len(items.sprites()) > 0:
             item_hit = pygame.sprite.groupcollide(
@@ -274,6 +715,7 @@ class GameLogic:
         
         # Now, reset the player's mask
         player.mask = oldmask
+        if prof: prof.mark("col4b")
 
         # Fifth: The player may not leave the screen, unless the ship is
         # respawning and doing a cool entrance animation, sort of
@@ -281,17 +723,19 @@ class GameLogic:
         if not player.has_target():
             if rect.right >= screen.right: 
                 (_, y) = player.get_position()
-                player.set_position((screen.right - player.get_width() / 2, y))
+                player.set_position((screen.right - player.get_width() // 2, y))
             if rect.left <= screen.left:
                 (_, y) = player.get_position()
-                player.set_position((screen.left + player.get_width() / 2, y))
+                player.set_position((screen.left + player.get_width() // 2, y))
             if rect.bottom >= screen.bottom:
                 (x, _) = player.get_position()
                 pheight = player.get_height()
-                player.set_position((x, screen.bottom - pheight / 2))
+                player.set_position((x, screen.bottom - pheight // 2))
             if rect.top <= screen.top:
                 (x, _) = player.get_position()
-                player.set_position((x, screen.top + player.get_height() / 2))
+                player.set_position((x, screen.top + player.get_height() // 2))
+
+        if prof: prof.mark("col5")
 
         #
         # Cleaning time!
@@ -303,6 +747,7 @@ class GameLogic:
             if ship.is_exploding(): 
                 ship.kill()
                 self.__explosions.add(ship)
+                self.__kills += 1
             # Ships are considired dead if they are more than 600 px away from
             # their nearest screen boundary
             virtual_screen = screen.inflate(1200, 1200)
@@ -316,25 +761,45 @@ class GameLogic:
         for shot in player_shots.sprites():
             if not screen.colliderect(shot.rect): 
                 shot.kill()
+        if prof: prof.mark("cleanup")
         
     # Runs one step in the game logic, including everything
     def tick(self):
+        prof = self.__profiler
         # Move the level, check for any additions
         self.__graphics.scroll()
+        if prof: prof.mark("scroll")
         self.check_level()
+        if prof: prof.mark("level")
         # Move anything that moves
         self.__enemy_shots.update()
+        if prof: prof.mark("upd_eshots")
         self.__player_shots.update()
+        if prof: prof.mark("upd_pshots")
         self.__ship.update()
+        if prof: prof.mark("upd_ship")
         self.__enemies.update()
+        if prof: prof.mark("upd_enemies")
         self.__items.update()
+        if prof: prof.mark("upd_items")
         # Check if anything has collided
         self.check_collisions()
+        # Play the sound effects triggered during this tick
+        self.__effects.flush()
+        if prof: prof.mark("sfx")
     
     def check_level(self):
         player = self.__ship
         dist = self.__graphics.get_total_distance()
         todo = self.__level.get(dist)
+
+        # When a boss is getting close, start reading its music in advance so
+        # that switching tracks does not make the game stutter
+        if self.__music is not None and not self.__boss_music:
+            upcoming = self.__level.upcoming(dist + BOSS_LOOKAHEAD)
+            if any(issubclass(kind, Boss) for kind in upcoming):
+                self.__music.prefetch(Music.boss)
+                self.__boss_music = True
         
         # Each of these are tuples with distance and a list of stuff to do. So
         # for each tuple work....
@@ -371,7 +836,9 @@ class GameLogic:
                     direction = (0, 1)
                     if 'direction' in item:
                         direction = item['direction']
-                    speed = 5 if 'speed' not in item else item['speed']
+                    speed = self.__options.enemyspeed
+                    if 'speed' in item:
+                        speed = item['speed']
 
                     if init == Item:
                         item_type = item['type']
@@ -393,31 +860,82 @@ class GameLogic:
         self.__graphics.set_scroll(speed)
 
     def paint_stuff(self):
+        """
+        Makes a draw list of the frame, see Render.py, and hands it over to be
+        painted and put on the screen. The draw list only holds copies of what
+        changes, so the game may go on while it is painted.
+        """
+        (shadow, flash, cap) = (True, True, None)
+        governor = self.__governor
+        ops = []
+        if governor:
+            (shadow, flash) = (governor.shadows(), governor.hit_flash())
+            cap = governor.explosion_cap()
+            ops.append((TEXT, governor.cached_text()))
+
         # Paint background
-        self.__graphics.paint_bg()
+        ops.append((BACKGROUND, self.__graphics.get_current_scroll()))
         
-        # Paint the ships
-        for explode in self.__explosions:
-            explode.blit()
+        # Paint the ships. Explosions over the cap go on without being painted.
+        for (i, explode) in enumerate(self.__explosions.sprites()):
+            if cap is None or i < cap:
+                explode.draw(ops, shadow, flash)
+            else:
+                explode.advance_explosion()
         for enemy in self.__enemies:
-            enemy.blit()
-        self.__ship.blit()
+            enemy.draw(ops, shadow, flash)
+        self.__ship.draw(ops, shadow, flash)
 
         # Paint GFX
         for shot in self.__enemy_shots:
-            shot.blit()
+            shot.draw(ops)
         for shot in self.__player_shots:
-            shot.blit()
+            shot.draw(ops)
         for item in self.__items:
-            item.blit()
+            item.draw(ops)
 
         # Print ship status
-        self.__graphics.paint_stats(self.__ship)
+        ship = self.__ship
+        ops.append((STATS, ship.get_lives(), ship.get_power(),
+                    self.__graphics.get_total_distance()))
         if self.__boss != None: 
-            self.__graphics.paint_boss(self.__boss)
+            boss = self.__boss
+            ops.append((BOSS, boss.max_damage - boss.get_damage()))
+        prof = self.__profiler
+        if prof and self.__overlay:
+            # Rendering the text is costly, so only do it now and then
+            lines = None
+            if prof.get_frames() % FRAMERATE == 0:
+                lines = prof.overlay_lines()
+                if governor:
+                    lines += governor.overlay_lines()
+                presenter = self.__presenter.report()['latency_ms']
+                if presenter is not None:
+                    lines.append("present %.1f/%.1fms" %
+                                 (presenter['p50'], presenter['p95']))
+            ops.append((PROFILE, lines))
+        if prof: prof.mark("paint")
         # Update the screen
-        flip()
+        self.__presenter.present(ops)
+        if prof: prof.mark("flip")
         
+    def advance_explosions(self):
+        """
+        Explosions are moved on when they are painted, so when the game is not
+        rendered, this is called in place of paint_stuff(). Ships are killed
+        when their explosions are over just the same.
+        """
+        for explode in self.__explosions:
+            explode.advance_explosion()
+        for enemy in self.__enemies:
+            if enemy.is_exploding():
+                enemy.advance_explosion()
+        if self.__ship.is_exploding():
+            self.__ship.advance_explosion()
+
+    def is_rendered(self):
+        return self.__render
+
     # Event handling function. 
     def handle_events(self):
         opts = self.__options
@@ -433,6 +951,24 @@ class GameLogic:
             if event.type == KEYDOWN and event.key == opts.abort:
                 self.__state = ABORTED
                 break
+
+            #
+            # Pause when asked to, or when the window loses focus or is
+            # minimized, since the player can't play then anyway.
+            #
+            if event.type == KEYDOWN and event.key == PAUSE_KEY:
+                self.__state = PAUSED
+
+            # Toggles the frame profiler and its overlay
+            if event.type == KEYDOWN and event.key == PROFILE_KEY:
+                if self.__profiler is None:
+                    self.enable_profiler()
+                else:
+                    self.disable_profiler()
+
+            if event.type == ACTIVEEVENT and event.gain == 0:
+                if event.state & (APPINPUTFOCUS | APPACTIVE):
+                    self.__state = PAUSED
             
             # 
             # Check for movement by the player. Movement is generated by
@@ -482,9 +1018,8 @@ class GameLogic:
             # 
             if event.type == BOSS_ENTER:
                 self.__boss = event.ship
-                if opts.music:
-                    pygame.mixer.music.load(join(MP3_PATH,"boss.mp3"))
-                    pygame.mixer.music.play()
+                if self.__music is not None:
+                    self.__music.play(Music.boss)
 
             if event.type == BOSS_EXIT:
                 # TODO: Some other cool effect?
@@ -493,3 +1028,8 @@ class GameLogic:
             if event.type == PLAYER_DIED:
                 self.__state = DIED
 
+
+def cpu_time():
+    """ CPU time used by this process so far, in seconds """
+    (user, system) = times()[:2]
+    return user + system
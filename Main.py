@@ -18,10 +18,27 @@ You should have received a copy of the GNU General Public License along with
 whutshmup. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import sys
+
 from Controller import Controller
+from Options import parse_resolution
+
+USAGE = "usage: Main.py [--resolution WIDTHxHEIGHT]"
 
 def main():
-    control = Controller()
+    """
+    The window size can be given as WIDTHxHEIGHT with --resolution, and is
+    then kept for later runs as well
+    """
+    args = sys.argv[1:]
+    resolution = None
+    if len(args) == 2 and args[0] == '--resolution':
+        resolution = parse_resolution(args[1])
+        if resolution is None:
+            sys.exit(USAGE)
+    elif len(args) > 0:
+        sys.exit(USAGE)
+    control = Controller(resolution)
     control.main()
 
 if __name__ == '__main__':
@@ -0,0 +1,157 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License along with 
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import sys
+from io import BytesIO
+from os.path import join
+from threading import Thread
+from time import sleep
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+import pygame
+
+from Common import MP3_PATH
+
+class Music:
+    """
+    Handles the background music. Opening and seeking in an MP3 file can take
+    long enough to make the game stutter, so every call here just queues a
+    command, and a background thread does the file reading, loading and
+    fading. Tracks can be prefetched into memory ahead of time, so switching
+    to them later does not touch the disk at all.
+
+    Only one music stream can play at a time in pygame, so a crossfade is a
+    fade out of the current track followed by a fade in of the next one.
+    """
+
+    cruising = join(MP3_PATH, "cruising.mp3")
+    boss = join(MP3_PATH, "boss.mp3")
+
+    def __init__(self, options, fade = 1000, volume = 0.8):
+        self.__options = options
+        self.__fade = fade
+        self.__volume = volume
+        # Prefetched tracks, only ever touched by the worker thread
+        self.__tracks = {}
+        self.__playing = None
+        # Tracks asked for by prefetch(), so they are only queued once
+        self.__requested = set()
+
+        self.__queue = Queue()
+        self.__worker = Thread(target = self.__run)
+        self.__worker.daemon = True
+        self.__worker.start()
+
+    def prefetch(self, track):
+        """
+        Reads a track into memory in the background, unless that has already
+        been asked for
+        """
+        if track not in self.__requested:
+            self.__requested.add(track)
+            self.__queue.put((self.__read, (track,)))
+
+    def play(self, track, loops = 0):
+        """
+        Fades out whatever is playing, then fades in the given track. Does
+        nothing if music is turned off in the options.
+        """
+        if self.__options.music:
+            self.__queue.put((self.__play, (track, loops)))
+
+    def pause(self):
+        self.__queue.put((pygame.mixer.music.pause, ()))
+
+    def unpause(self):
+        self.__queue.put((pygame.mixer.music.unpause, ()))
+
+    def stop(self, fade = 0):
+        self.__queue.put((self.__stop, (fade,)))
+
+    def quit(self):
+        """
+        Stops the music and waits for the background thread to finish. Has to
+        be called before the mixer is shut down.
+        """
+        self.stop()
+        self.__queue.put(None)
+        self.__worker.join()
+
+    #
+    # Everything below runs on the background thread
+    #
+
+    def __run(self):
+        command = self.__queue.get()
+        while command is not None:
+            (fun, args) = command
+            try:
+                fun(*args)
+            except Exception as error:
+                # A missing or broken track is skipped, the music goes on
+                sys.stderr.write("Music: %s\n" % error)
+                if not pygame.mixer.music.get_busy():
+                    self.__playing = None
+            command = self.__queue.get()
+
+    def __read(self, track):
+        if track not in self.__tracks:
+            try:
+                f = open(track, "rb")
+                try:
+                    self.__tracks[track] = f.read()
+                finally:
+                    f.close()
+            except (IOError, OSError):
+                # Not read after all, so it may be asked for again
+                self.__requested.discard(track)
+                raise
+
+    def __play(self, track, loops):
+        self.__read(track)
+        self.__stop(self.__fade)
+        # The music module streams from the file object while playing, so the
+        # data has to be kept around until the track is changed
+        pygame.mixer.music.load(BytesIO(self.__tracks[track]))
+        pygame.mixer.music.set_volume(0)
+        pygame.mixer.music.play(loops)
+        self.__playing = track
+        self.__ramp(0, self.__volume, self.__fade)
+
+    def __stop(self, fade):
+        if pygame.mixer.music.get_busy():
+            self.__ramp(pygame.mixer.music.get_volume(), 0, fade)
+            pygame.mixer.music.stop()
+        self.__playing = None
+
+    def __ramp(self, start, end, fade, steps = 20):
+        """
+        Changes the volume gradually, during fade milliseconds. Sleeping here
+        only holds up the background thread, never the game.
+        """
+        if fade <= 0:
+            steps = 1
+        for i in range(1, steps + 1):
+            sleep(fade / 1000.0 / steps)
+            pygame.mixer.music.set_volume(start + (end - start) * i / steps)
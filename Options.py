@@ -18,9 +18,12 @@
 #
 
 import pickle
+from pygame import get_sdl_version
 from pygame.locals import K_LEFT, K_DOWN, K_UP, K_RIGHT, K_SPACE
 from pygame.locals import K_ESCAPE, K_RETURN
 
+from Common import SHIPSPEED, ENEMYSPEED, SHOTSPEED, WINDOW_SIZE
+
 class Options(object):
     
     optionsfile = "options.dat"
@@ -31,7 +34,8 @@ class Options(object):
             opts = pickle.load(f)
             f.close()
             return opts
-        except IOError:
+        except (IOError, ValueError, EOFError, pickle.UnpicklingError):
+            # Missing, or cut short, or saved by a newer version of python
             return Options()
 
     def __init__(self):
@@ -43,14 +47,57 @@ class Options(object):
         self.__fire = K_SPACE
         self.__abort = K_ESCAPE
         self.__confirm = K_RETURN
+        # Key codes differ between SDL 1 and 2, so remember which one they
+        # are from
+        self.__keys_sdl = get_sdl_version()[0]
 
         # Boolean data
         self.__fullscreen = False
         self.__music = True
         self.__sfx = True
 
-        # TODO: Customizeable. How to do with ships etc? Scaling?
-        self.__resolution = (800, 600) 
+        # Size of the window. The game is scaled to fit it, see Graphics.
+        self.__resolution = WINDOW_SIZE
+
+        # Audio output. A buffer size of None means that the smallest buffer
+        # that works on this machine is picked when the game starts.
+        self.__audio_frequency = 44100
+        self.__audio_buffer = None
+
+        # Speeds of the player, of enemies that do not have a speed of their
+        # own, and of shots. Only changed when balancing the game.
+        self.__shipspeed = SHIPSPEED
+        self.__enemyspeed = ENEMYSPEED
+        self.__shotspeed = SHOTSPEED
+
+    def __getstate__(self):
+        """
+        The speeds are not saved, so that a saved file never holds on to the
+        speeds of an older version of the game
+        """
+        state = dict(self.__dict__)
+        for name in ['shipspeed', 'enemyspeed', 'shotspeed']:
+            state.pop('_Options__' + name, None)
+        return state
+
+    def __setstate__(self, state):
+        """
+        Options saved by older versions lack some of the values, so start
+        from the defaults and apply whatever was saved on top of them.
+        """
+        self.__init__()
+        # Keys saved with another SDL version are other keys now, so the
+        # default keys are kept. Options that do not say were saved with SDL 1.
+        if state.get('_Options__keys_sdl', 1) != self.__keys_sdl:
+            keys = ['_Options__' + name for name in ['left', 'down', 'up',
+                    'right', 'fire', 'abort', 'confirm', 'keys_sdl']]
+            state = dict((name, value) for (name, value) in state.items()
+                         if name not in keys)
+        # A window size that cannot be used, saved by an older version
+        if parse_resolution(state.get('_Options__resolution')) is None:
+            state = dict(state)
+            state.pop('_Options__resolution', None)
+        self.__dict__.update(state)
 
     def set_index(self, index, value):
         fs = [lambda v: self.set_left(v), lambda v: self.set_down(v)
@@ -141,8 +188,65 @@ class Options(object):
     sfx = property(get_sfx, set_sfx)
     sound = property(get_sfx, set_sfx)
 
+    def get_resolution(self):
+        return self.__resolution
+
+    def set_resolution(self, value):
+        self.__resolution = tuple(value)
+    resolution = property(get_resolution, set_resolution)
+
+    def get_audio_frequency(self):
+        return self.__audio_frequency
+
+    def set_audio_frequency(self, value):
+        self.__audio_frequency = value
+    audio_frequency = property(get_audio_frequency, set_audio_frequency)
+
+    def get_audio_buffer(self):
+        return self.__audio_buffer
+
+    def set_audio_buffer(self, value):
+        self.__audio_buffer = value
+    audio_buffer = property(get_audio_buffer, set_audio_buffer)
+
+    def get_shipspeed(self):
+        return self.__shipspeed
+
+    def set_shipspeed(self, value):
+        self.__shipspeed = value
+    shipspeed = property(get_shipspeed, set_shipspeed)
+
+    def get_enemyspeed(self):
+        return self.__enemyspeed
+
+    def set_enemyspeed(self, value):
+        self.__enemyspeed = value
+    enemyspeed = property(get_enemyspeed, set_enemyspeed)
+
+    def get_shotspeed(self):
+        return self.__shotspeed
+
+    def set_shotspeed(self, value):
+        self.__shotspeed = value
+    shotspeed = property(get_shotspeed, set_shotspeed)
+
     def save(self):
         f = open(Options.optionsfile, "wb")
-        pickle.dump(self, f)
+        # Protocol 2 is the newest one python 2 can read too
+        pickle.dump(self, f, 2)
         f.close()
 
+def parse_resolution(value):
+    """
+    A window size as a pair of positive ints, from WIDTHxHEIGHT or a pair, or
+    None if it is not one
+    """
+    try:
+        if isinstance(value, str):
+            value = [int(size) for size in value.split('x')]
+        (width, height) = value
+    except (TypeError, ValueError):
+        return None
+    if not all(isinstance(size, int) and size > 0 for size in value):
+        return None
+    return (width, height)
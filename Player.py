@@ -20,8 +20,9 @@ whutshmup. If not, see <http://www.gnu.org/licenses/>.
 
 from os.path import join
 from pygame.event import Event, post
+from pygame.rect import Rect
 
-from Common import GFX_PATH, SHOTSPEED, USER_FIRE, PLAYER_DIED
+from Common import GFX_PATH, USER_FIRE, PLAYER_DIED, GAME_SIZE
 from Ship import Ship, Animation
 from Shot import Shot
 
@@ -36,6 +37,7 @@ class Player(Ship):
     """
 
     shipfile = join(GFX_PATH,"deltawing.png")
+    assets = Ship.assets + [shipfile, Shot.playershot, Shot.playersound]
 
     # TODO: Specific hitbox colour that can be mapped instead?
     hitbox = (30, 13, 8, 18) # Measured in GIMP on deltawing.png, heh
@@ -47,6 +49,8 @@ class Player(Ship):
         # Use to animate hitbox or something
         ship = self.res.get_graphics(Player.shipfile)
         self.__animation = Animation([ship], 5)
+        # The animation image last set, which is only set again if it changes
+        self.__shown = None
 
         # The player can be continously firing by holding the fire button
         self.__firing = False
@@ -56,17 +60,21 @@ class Player(Ship):
         self.__power = 1
         self.__lives = 3
         self.__targetspeed = 0
+        # Shots fired and damage taken since the ship was made, for statistics
+        self.__fired = 0
+        self.__taken = 0
 
         self.__hitmask = self.mask.scale(self.mask.get_size())
         self.create_hitbox(Player.hitbox)
         self.mask = self.__hitmask
 
-    def create_hitbox(self, (x, y, width, height)):
+    def create_hitbox(self, hitbox):
         """
         The hitbox is typically not the whole ship, so it can be set here. This
         should be called only when changing image, since if the hitbox is large,
         this will take too much power to be computed at each tick.
         """
+        (x, y, width, height) = hitbox
         self.__hitmask.clear()
         for i in range(width):
             for j in range(height):
@@ -83,7 +91,10 @@ class Player(Ship):
         # Maybe change the animation image
         self.__animation.update()
         # And in that case, this changes, too!
-        self.set_image(self.__animation.get_image())
+        image = self.__animation.get_image()
+        if image is not self.__shown:
+            self.set_image(image)
+            self.__shown = image
         self.mask = self.__hitmask
 
         super(Player, self).update()
@@ -112,13 +123,34 @@ class Player(Ship):
         which is boolean.
         """
         pos, shipdir = self.get_position(), self.get_direction()
+        speed = self.options.shotspeed
+        self.__fired += 1
         if sound:
-            return Shot(self.common, Shot.playershot, pos, shipdir, SHOTSPEED, 
+            return Shot(self.common, Shot.playershot, pos, shipdir, speed,
                         Shot.mediumdamage, Shot.playersound)
         else:
-            return Shot(self.common, Shot.playershot, pos, shipdir, SHOTSPEED, 
+            return Shot(self.common, Shot.playershot, pos, shipdir, speed,
                         Shot.mediumdamage, None)
 
+    def get_record(self):
+        """ Adds the power, lives, firing and statistics to the Ship record """
+        return (super(Player, self).get_record(),
+                (self.__power, self.__lives, self.__firing, self.__firecounter,
+                 self.__targetspeed, self.__fired, self.__taken,
+                 self.__animation.get_record()))
+
+    def set_record(self, record):
+        """
+        The player is put back in place rather than made anew, and keeps its
+        hitbox
+        """
+        (ship, player) = record
+        super(Player, self).set_record(ship)
+        (self.__power, self.__lives, self.__firing, self.__firecounter,
+         self.__targetspeed, self.__fired, self.__taken, animation) = player
+        self.__animation.set_record(animation)
+        self.mask = self.__hitmask
+
     def respawn(self):
         """
         If the player dies but has more lives, a respawn is performed. This
@@ -129,7 +161,7 @@ class Player(Ship):
         self.__power = 1
         self.reset_damage()
         # Set location
-        rect = self.surface.get_rect()
+        rect = Rect((0, 0), GAME_SIZE)
         (x, y) = rect.centerx, rect.bottom - 100
         self.set_position((x, y))
         # TODO: Nice entrance
@@ -142,6 +174,7 @@ class Player(Ship):
         Override from ship, since for the player, power and damage are each
         others opposites. Therefore, we emulate that behaviour in this method.
         """
+        self.__taken += amount
         self.__power -= amount
         if self.__power <= 0:
             super(Player, self).add_damage(self.max_damage)
@@ -165,6 +198,17 @@ class Player(Ship):
     def is_firing(self):
         return self.__firing
 
+    def get_firecounter(self):
+        return self.__firecounter
+
+    def set_firecounter(self, value):
+        """
+        The fire counter decides in which tick the next shots are fired. It is
+        only set directly to replay a game from a given state.
+        """
+        self.__firecounter = value
+    firecounter = property(get_firecounter, set_firecounter)
+
     def set_power(self, value):
         self.__power = value
     
@@ -179,3 +223,11 @@ class Player(Ship):
         return self.__lives
     lives = property(get_lives, set_lives)
 
+    def get_shots_fired(self):
+        return self.__fired
+    shots_fired = property(get_shots_fired)
+
+    def get_damage_taken(self):
+        return self.__taken
+    damage_taken = property(get_damage_taken)
+
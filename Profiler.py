@@ -0,0 +1,97 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License along with 
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+from collections import deque
+from timeit import default_timer as clock
+
+class Profiler:
+    """
+    Measures how long each phase of a frame takes. A frame is started with
+    begin_frame(), and then mark() is called at the end of every phase, which
+    attributes the time since the previous mark to that phase. The last
+    window frames are kept for each phase, to compute averages and
+    percentiles from.
+    """
+
+    def __init__(self, window = 150):
+        self.__window = window
+        self.__times = {}
+        # Phases in the order they were first seen, for presentation
+        self.__phases = []
+        self.__start = self.__last = clock()
+        self.__frames = 0
+
+    def begin_frame(self):
+        self.__start = self.__last = clock()
+
+    def mark(self, phase):
+        now = clock()
+        if phase not in self.__times:
+            self.__times[phase] = deque(maxlen = self.__window)
+            self.__phases.append(phase)
+        self.__times[phase].append(now - self.__last)
+        self.__last = now
+
+    def end_frame(self):
+        """ Records the time of the whole frame, from begin_frame() on """
+        self.__last = self.__start
+        self.mark("frame")
+        self.__frames += 1
+
+    def get_frames(self):
+        return self.__frames
+
+    def get_phases(self):
+        return list(self.__phases)
+
+    def stats(self, phase):
+        """
+        The mean, 50th, 95th and 99th percentile of the time a phase took
+        during the last frames, in seconds
+        """
+        times = sorted(self.__times.get(phase, []))
+        if len(times) == 0:
+            return None
+        return { 'mean' : sum(times) / len(times)
+               , 'p50' : percentile(times, 50)
+               , 'p95' : percentile(times, 95)
+               , 'p99' : percentile(times, 99)
+               }
+
+    def report(self):
+        """ Statistics for all phases, as a dictionary """
+        return dict((phase, self.stats(phase)) for phase in self.__phases)
+
+    def overlay_lines(self):
+        """
+        Compact text lines with the median and 95th percentile of each phase
+        in milliseconds, narrow enough for the side panels
+        """
+        lines = ["phase  p50  p95"]
+        for phase in self.__phases:
+            s = self.stats(phase)
+            lines.append("%-6s%4.1f %4.1f" % (phase[:6], s['p50'] * 1000,
+                                              s['p95'] * 1000))
+        return lines
+
+def percentile(values, p):
+    """ Percentile of a sorted, non-empty list, by the nearest rank """
+    index = int(round(p / 100.0 * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
@@ -0,0 +1,110 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Quality.py
+#
+# Lowers the quality of the graphics when frames take too long, and raises it
+# again once there is time to spare. Only what is painted changes, never how
+# the game plays.
+#
+
+from collections import deque
+
+from Profiler import percentile
+
+# Quality tiers, from the best looking to the cheapest. Each tier turns off
+# one more thing, on top of what the tiers before it turned off.
+FULL = 0
+NO_SHADOWS = 1
+NO_HIT_FLASH = 2
+CACHED_TEXT = 3
+FEW_EXPLOSIONS = 4
+TIER_NAMES = ["full", "noshadow", "noflash", "cachetxt", "fewexpl"]
+
+# Explosions painted per frame in the cheapest tier. The rest still go on,
+# they are just not painted.
+EXPLOSION_CAP = 4
+
+class Governor:
+    """
+    Watches the time of the last frames, and steps down a tier when the 90th
+    percentile of them is above the high part of the budget, or up a tier
+    when it is below the low part. After a switch, the frames are watched
+    anew for a while before switching again, and stepping up waits longer
+    than stepping down, so that the quality does not flicker back and forth.
+    """
+
+    def __init__(self, budget, window = 30, high = 0.9, low = 0.6):
+        self.__budget = budget
+        self.__high = high
+        self.__low = low
+        self.__window = window
+        self.__times = deque(maxlen = window)
+        self.__tier = FULL
+        self.__switches = 0
+        # Frames left before the next switch up may happen
+        self.__wait = 0
+
+    def frame(self, seconds):
+        """ Called with the time every frame took, without the idle time """
+        self.__times.append(seconds)
+        if self.__wait > 0:
+            self.__wait -= 1
+        if len(self.__times) < self.__window:
+            return
+        slow = percentile(sorted(self.__times), 90)
+        if slow > self.__budget * self.__high and self.__tier < FEW_EXPLOSIONS:
+            self.__switch(self.__tier + 1)
+        elif (slow < self.__budget * self.__low and self.__tier > FULL and
+              self.__wait == 0):
+            self.__switch(self.__tier - 1)
+
+    def __switch(self, tier):
+        self.__tier = tier
+        self.__switches += 1
+        self.__times.clear()
+        self.__wait = self.__window * 4
+
+    def get_tier(self):
+        return self.__tier
+
+    def set_tier(self, tier):
+        self.__tier = tier
+        self.__times.clear()
+
+    def get_switches(self):
+        return self.__switches
+
+    def shadows(self):
+        return self.__tier < NO_SHADOWS
+
+    def hit_flash(self):
+        return self.__tier < NO_HIT_FLASH
+
+    def cached_text(self):
+        return self.__tier >= CACHED_TEXT
+
+    def explosion_cap(self):
+        """ How many explosions may be painted per frame, or None for all """
+        return EXPLOSION_CAP if self.__tier >= FEW_EXPLOSIONS else None
+
+    def overlay_lines(self):
+        return ["tier %d %s" % (self.__tier, TIER_NAMES[self.__tier]),
+                "switches %d" % self.__switches]
@@ -0,0 +1,198 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Render.py
+#
+# Painting a frame from a draw list, and presenting it on the screen, either
+# right away or in a thread of its own while the next frame is simulated.
+#
+
+from collections import deque
+from threading import Thread, Lock
+from timeit import default_timer as clock
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+import pygame
+from pygame.draw import circle
+
+from Profiler import percentile
+from Shadows import add_shadow
+
+# Kinds of draw operations. A draw list is a list of tuples, each with one of
+# these first and then what is needed to draw it. Images in a draw list must
+# not be changed afterwards; sprites make new images rather than change them.
+BACKGROUND = 0  # (BACKGROUND, scroll)
+BLIT = 1        # (BLIT, image, position)
+SHADOW = 2      # (SHADOW, image, position), the image with a drop shadow
+CIRCLE = 3      # (CIRCLE, color, center, radius)
+STATS = 4       # (STATS, lives, power, distance)
+BOSS = 5        # (BOSS, life)
+PROFILE = 6     # (PROFILE, lines), lines of the overlay, or None if the same
+TEXT = 7        # (TEXT, cached), whether panel text is cached
+
+# Held while reading the pixels of images, which locks them. Blitting and
+# making masks let go of the interpreter lock, and an image locked by one
+# thread cannot be blitted by another, so the game holds this when it
+# rotates images or makes masks of them, and render() when it paints.
+SURFACES = Lock()
+
+def render(graphics, ops):
+    """ Paints a draw list onto the screen, without flipping it """
+    for op in ops:
+        with SURFACES:
+            paint(graphics, op)
+
+def paint(graphics, op):
+    """
+    Paints a single operation of a draw list. Positions and images are those
+    of the game, and are scaled to the window, see Graphics.scaled.
+    """
+    surface = graphics.surface
+    kind = op[0]
+    if kind == BLIT:
+        surface.blit(graphics.scaled(op[1]), graphics.place(op[2]))
+    elif kind == SHADOW:
+        image = add_shadow(graphics.scaled(op[1]), graphics.place((10, 10)))
+        surface.blit(image, graphics.place(op[2]))
+    elif kind == CIRCLE:
+        radius = int(op[3] * graphics.get_scale())
+        circle(surface, op[1], graphics.place(op[2]), radius)
+    elif kind == BACKGROUND:
+        graphics.paint_bg(op[1])
+    elif kind == STATS:
+        graphics.paint_stats(op[1], op[2], op[3])
+    elif kind == BOSS:
+        graphics.paint_boss(op[1])
+    elif kind == PROFILE:
+        if op[1] is not None:
+            graphics.set_profile(op[1])
+        graphics.paint_profile()
+    elif kind == TEXT:
+        graphics.set_cached_text(op[1])
+
+class Presenter:
+    """
+    Paints draw lists and flips the screen in the thread that gives them to
+    it. Measures the latency of every frame, from when its draw list was
+    done until it was on the screen, over the last window frames.
+    """
+
+    def __init__(self, graphics, window = 300):
+        self.graphics = graphics
+        self.__latencies = deque(maxlen = window)
+        # Time the game spent waiting to hand over a draw list
+        self.__blocked = deque(maxlen = window)
+
+    def present(self, ops):
+        start = clock()
+        self.show(ops, start)
+        self.record_blocked(clock() - start)
+
+    def show(self, ops, done):
+        """ Paints a draw list and flips, done being when the list was made """
+        render(self.graphics, ops)
+        pygame.display.flip()
+        self.__latencies.append(clock() - done)
+
+    def wait(self):
+        """ Returns once everything handed over is on the screen """
+        pass
+
+    def stop(self):
+        pass
+
+    def is_threaded(self):
+        return False
+
+    def report(self):
+        """ Latency and blocked time percentiles in milliseconds """
+        return { 'latency_ms' : summary(self.__latencies)
+               , 'blocked_ms' : summary(self.__blocked)
+               }
+
+    def record_blocked(self, seconds):
+        self.__blocked.append(seconds)
+
+class ThreadedPresenter(Presenter):
+    """
+    Paints draw lists and flips the screen in a thread of its own, so that
+    the game can go on with the next frame meanwhile. Blitting and flipping
+    let go of the interpreter lock, so the two really do run side by side.
+    One draw list may wait while another is being painted; handing over a
+    third blocks until the first is done, so the screen is never more than a
+    frame behind.
+
+    Nothing else may draw on the screen while frames are being presented, so
+    wait() has to be called before that.
+    """
+
+    def __init__(self, graphics, window = 300):
+        Presenter.__init__(self, graphics, window)
+        self.__queue = Queue(1)
+        # Anything raised while presenting, to be raised in the game instead
+        self.__error = None
+        self.__thread = Thread(target = self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def present(self, ops):
+        if self.__error is not None:
+            raise self.__error
+        start = clock()
+        self.__queue.put((ops, start))
+        self.record_blocked(clock() - start)
+
+    def wait(self):
+        self.__queue.join()
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__queue.put(None)
+            self.__thread.join()
+            self.__thread = None
+
+    def is_threaded(self):
+        return True
+
+    def __run(self):
+        while True:
+            frame = self.__queue.get()
+            try:
+                if frame is None:
+                    return
+                self.show(*frame)
+            except Exception as error:
+                self.__error = error
+            finally:
+                self.__queue.task_done()
+
+def summary(times):
+    """ Median, 95th percentile and maximum of times, in milliseconds """
+    times = sorted(times)
+    if len(times) == 0:
+        return None
+    return { 'p50' : percentile(times, 50) * 1000
+           , 'p95' : percentile(times, 95) * 1000
+           , 'max' : times[-1] * 1000
+           }
@@ -0,0 +1,164 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Replay.py
+#
+# Recording of the player's input during a level, and playing it back. The
+# game itself has no randomness apart from the seed of endless levels, so the
+# input is all that is needed to play a level again exactly as it went.
+#
+
+from struct import Struct
+
+from pygame.event import clear
+
+from Level import EndlessLevel, level_convert
+
+# Bits of the input of a tick, see GameLogic.get_input. The two highest bits
+# hold which of the arrows was pressed last.
+UP = 1
+DOWN = 2
+LEFT = 4
+RIGHT = 8
+FIRE = 16
+ABORT = 32
+LAST_SHIFT = 6
+
+# Level number of endless levels, which are made from the seed instead
+ENDLESS = -1
+
+# Header of a recording: magic, version, level number, seed, and the position,
+# lives, power and fire counter of the player when the level started. Then
+# follows one byte of input per tick, and a 32 bit state hash per tick.
+RECORDING_MAGIC = b"WSIR"
+RECORDING_VERSION = 1
+RECORDING_HEADER = Struct("<4sBiiddiiiI")
+
+class Recording:
+    """
+    The input of the player in each tick of a level, along with a hash of the
+    state of the game after the tick. Replaying a recording is deterministic,
+    and the hashes are used to check that it really is.
+    """
+
+    def __init__(self, level, seed = 0, player = None):
+        """
+        The player is the ship at the start of the level, which does not always
+        look the same, since lives and power carry over from earlier levels.
+        """
+        self.level = level
+        self.seed = seed
+        self.start = ((0.0, 0.0), 3, 1, 1)
+        if player is not None:
+            self.start = (tuple(player.get_position()), player.lives,
+                          player.power, player.firecounter)
+        self.__inputs = bytearray()
+        self.__hashes = []
+
+    def record(self, bits, digest):
+        self.__inputs.append(bits)
+        self.__hashes.append(digest & 0xffffffff)
+
+    def get_input(self, tick):
+        return self.__inputs[tick]
+
+    def get_hash(self, tick):
+        return self.__hashes[tick]
+
+    def __len__(self):
+        return len(self.__inputs)
+
+    def make_level(self):
+        """ A new copy of the level the recording was made in """
+        if self.level == ENDLESS:
+            return EndlessLevel(self.seed)
+        return level_convert()[self.level]
+
+    def restore_player(self, player):
+        """ Puts the player ship back the way it was when recording started """
+        (position, lives, power, firecounter) = self.start
+        player.set_position(position)
+        player.lives = lives
+        player.power = power
+        player.firecounter = firecounter
+
+    def save(self, filename):
+        ((x, y), lives, power, firecounter) = self.start
+        ticks = len(self)
+        f = open(filename, "wb")
+        try:
+            f.write(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION,
+                                          self.level, self.seed, x, y, lives,
+                                          power, firecounter, ticks))
+            f.write(bytes(self.__inputs))
+            f.write(Struct("<%dI" % ticks).pack(*self.__hashes))
+        finally:
+            f.close()
+
+    @staticmethod
+    def load(filename):
+        """ Reads a recording, raising an IOError if the file is not one """
+        f = open(filename, "rb")
+        try:
+            header = f.read(RECORDING_HEADER.size)
+            if len(header) != RECORDING_HEADER.size:
+                raise IOError("Not a recording: %s" % filename)
+            (magic, version, level, seed, x, y, lives, power, firecounter,
+             ticks) = RECORDING_HEADER.unpack(header)
+            if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+                raise IOError("Not a recording: %s" % filename)
+            inputs = bytearray(f.read(ticks))
+            hashes = Struct("<%dI" % ticks)
+            data = f.read(hashes.size)
+            if len(inputs) != ticks or len(data) != hashes.size:
+                raise IOError("Truncated recording: %s" % filename)
+        finally:
+            f.close()
+        recording = Recording(level, seed)
+        recording.start = ((x, y), lives, power, firecounter)
+        for (bits, digest) in zip(inputs, hashes.unpack(data)):
+            recording.record(bits, digest)
+        return recording
+
+def replay(logic, graphics, recording, check = True):
+    """
+    Plays a recording back through the game logic as fast as possible, without
+    waiting for the frame rate. The logic has to have a player. Returns the
+    first tick where the state of the game differs from when it was recorded,
+    or None if the replay went the same way all through (or was not checked).
+    """
+    # Shots still queued up from an earlier game would turn up in the first tick
+    clear()
+    logic.clear()
+    graphics.reset_distance()
+    graphics.set_scroll(5)
+    logic.set_level(recording.make_level())
+    recording.restore_player(logic.get_player())
+    for tick in range(len(recording)):
+        bits = recording.get_input(tick)
+        # The game ended on this tick, so there is nothing more to compare
+        if bits & ABORT:
+            break
+        logic.set_input(bits)
+        if not logic.step():
+            break
+        if check and logic.state_hash() != recording.get_hash(tick):
+            return tick
+    return None
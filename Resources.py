@@ -18,12 +18,34 @@ whutshmup. If not, see <http://www.gnu.org/licenses/>.
 
 """
 
+from collections import OrderedDict
+from functools import partial
 from glob import glob
-from os.path import isfile, join
+from io import BytesIO
+from mmap import mmap, ACCESS_READ, ALLOCATIONGRANULARITY
+from multiprocessing.pool import ThreadPool
+from os import makedirs, stat, getpid, remove
+from os.path import isdir, isfile, join
+from struct import Struct
+from time import time
 
-from Common import GFX_PATH, SND_PATH
-from pygame.image import load
-from pygame.mixer import Sound
+try:
+    from os import replace
+except ImportError:
+    # Python 2, where renaming over a file replaces it as well on posix
+    from os import rename as replace
+
+from Common import GFX_PATH, SND_PATH, CACHE_PATH
+from pygame.display import get_surface
+from pygame.image import load, tostring, frombuffer
+from pygame.mixer import Sound, get_init
+from pygame.transform import smoothscale
+
+# Header of a pixel cache file: magic, width, height, source mtime, source
+# size, and the bit size and masks of the display format. The pixels start at
+# the next allocation boundary, so they can be memory mapped on their own.
+CACHE_MAGIC = b"WSPX"
+CACHE_HEADER = Struct("<4sIIdQ5I")
 
 class Resources:
     """
@@ -31,30 +53,136 @@ class Resources:
     it should be initialized just after pygame is initialized. It cannot be
     used before pygame is initialized, since it uses pygame functions.
 
+    The cache may be given a budget in bytes. Assets are then evicted, least
+    recently used first, whenever the resident size goes above the budget.
+    Pinned assets are never evicted.
+
+    When the window is scaled, every image is also kept scaled to the window,
+    see set_scale. The scaled images are kept on disk like the pixel cache,
+    so they are only scaled once for every scale.
+
     NOTE: Don't use this class to load music, since the music module in pygame
           handles music by streaming as opposed to sound effects
     """
 
-    def __init__(self):
-        """ Initialize the cache directories, empty at start """
+    def __init__(self, cache = CACHE_PATH, budget = None):
+        """
+        Initialize the cache directories, empty at start. Converted pixels of
+        all images are also kept on disk in the given directory, so later runs
+        can skip decoding the PNG files. Use None to turn that off.
+        A budget of None means that nothing is ever evicted.
+        """
+        self.__cache = cache
         self.__graphics = {}
         self.__sound = {}
+        # Seconds spent loading each asset, and the whole preload
+        self.__load_times = {}
+        self.__total_time = 0
+
+        # Size in bytes of each resident asset, least recently used first
+        self.__budget = budget
+        self.__sizes = OrderedDict()
+        self.__resident = 0
+        self.__pinned = set()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+        # Assets being loaded in the background, see prefetch()
+        self.__pending = []
 
-    def preload_all(self):
+        # Images scaled to the window by key, and the key of every image,
+        # when the scale is not 1
+        self.__scale = 1
+        self.__scaled = {}
+        self.__keys = {}
+
+    def preload_all(self, workers = 4):
         """
         preload_all should be used before the game starts to improve
         performance, by caching all sounds in the sound directory and all
         graphics in the graphics directory. Note however, as with the rest of
         this module, that both pygame and its mixer has to be initialized for
         this to work.
+        Returns the total time taken.
         """
-
         snd = glob(join(SND_PATH,"*.wav"))
-        for sound in snd:
-            self.get_sound(sound)
         gfx = glob(join(GFX_PATH,"*.png"))
-        for image in gfx:
-            self.get_graphics(image)
+        return self.preload(gfx + snd, workers)
+
+    def preload(self, keys, workers = 4):
+        """
+        Loads the given graphics and sound files into the cache, unless they
+        are already there. Returns the total time taken.
+        """
+        self.prefetch(keys, workers)
+        return self.collect()
+
+    def prefetch(self, keys, workers = 4):
+        """
+        Starts loading the given graphics and sound files in the background.
+        Decoding images and reading sound files is done on a pool of worker
+        threads. Converting images to the display format and creating the
+        Sound objects depend on the display and the mixer, so that is left for
+        collect(), which has to be called from the main thread later on.
+        """
+        start = time()
+        snd = [k for k in keys if is_sound(k) and k not in self.__sound]
+        gfx = [k for k in keys if not is_sound(k) and k not in self.__graphics]
+
+        decode = partial(decode_image, cache = self.__cache,
+                         fmt = display_format())
+        if workers > 1:
+            pool = ThreadPool(workers)
+            sounds = pool.map_async(read_sound, snd)
+            images = pool.map_async(decode, gfx)
+            pool.close()
+            self.__pending.append((start, pool, sounds, images))
+        else:
+            sounds = [read_sound(key) for key in snd]
+            images = [decode(key) for key in gfx]
+            self.__pending.append((start, None, sounds, images))
+
+    def collect(self):
+        """
+        Waits for any assets started by prefetch() and puts them in the cache.
+        Returns the time taken from the start of the first prefetch.
+        """
+        if len(self.__pending) == 0:
+            return 0
+        start = self.__pending[0][0]
+        while len(self.__pending) > 0:
+            (_, pool, sounds, images) = self.__pending.pop(0)
+            if pool is not None:
+                sounds, images = sounds.get(), images.get()
+                pool.join()
+
+            for (key, data, elapsed) in sounds:
+                before = time()
+                if key not in self.__sound:
+                    self.__add(self.__sound, key, Sound(file = BytesIO(data)))
+                self.__load_times[key] = elapsed + time() - before
+            for (key, image, elapsed, cached) in images:
+                before = time()
+                if key not in self.__graphics:
+                    image = image.convert_alpha()
+                    if not cached:
+                        self.__write_cache(key, image)
+                    self.__add(self.__graphics, key, image)
+                self.__load_times[key] = elapsed + time() - before
+
+        self.__total_time = time() - start
+        return self.__total_time
+
+    def get_load_times(self):
+        """
+        Returns a dictionary from each preloaded asset to the number of seconds
+        it took to load it, counting both the worker and the main thread.
+        """
+        return dict(self.__load_times)
+
+    def get_total_load_time(self):
+        return self.__total_time
 
     def get_graphics(self, key):
         """
@@ -63,23 +191,319 @@ class Resources:
         return it.
         If the file corresponding to the key does not exist an IOError is raised
         """
-        if key not in self.__graphics:
-            if isfile(key):
-                self.__graphics[key] = load(key).convert_alpha()
-            else:
-                raise IOError("File doesn't exist")
+        if key in self.__graphics:
+            self.__touch(key)
+        elif isfile(key):
+            (_, image, _, cached) = decode_image(key, self.__cache,
+                                                 display_format())
+            image = image.convert_alpha()
+            if not cached:
+                self.__write_cache(key, image)
+            self.__misses += 1
+            self.__add(self.__graphics, key, image)
+            return image
+        else:
+            raise IOError("File doesn't exist")
         return self.__graphics[key]
 
+    def set_scale(self, scale):
+        """
+        Sets how much the window is scaled. Every image is then also scaled
+        once, when it is loaded, see get_scaled. Images already loaded are
+        scaled right away.
+        """
+        if scale == self.__scale:
+            return
+        self.__scale = scale
+        for key in list(self.__scaled):
+            size = asset_size(self.__scaled.pop(key))
+            self.__sizes[key] -= size
+            self.__resident -= size
+        self.__keys = {}
+        for (key, image) in self.__graphics.items():
+            self.__prescale(key, image)
+        self.__evict()
+
+    def get_scale(self):
+        return self.__scale
+
+    def get_scaled(self, key):
+        """
+        Like get_graphics, but the image is scaled to the window. It is the
+        very same image when the scale is 1.
+        """
+        image = self.get_graphics(key)
+        return self.__scaled.get(key, image)
+
+    def get_scaled_image(self, image):
+        """
+        The scaled version of an image that was returned by get_graphics, or
+        None if it was not. Only looks in the cache, so it may be used from
+        other threads than the main one.
+        """
+        if self.__scale == 1:
+            return image
+        key = self.__keys.get(image)
+        if key is None:
+            return None
+        return self.__scaled.get(key)
+
     def get_sound(self, key):
         """
         If the key is already loaded into the cache, return it. If not, load the
         sound, insert it into the cache, then return it.
         If the file corresponding to the key does not exist an IOError is raised
         """
-        if key not in self.__sound:
-            if isfile(key):
-                self.__sound[key] = Sound(key)
-            else:
-                raise IOError("File doesn't exist")
+        if key in self.__sound:
+            self.__touch(key)
+        elif isfile(key):
+            sound = Sound(key)
+            self.__misses += 1
+            self.__add(self.__sound, key, sound)
+            return sound
+        else:
+            raise IOError("File doesn't exist")
         return self.__sound[key]
 
+    def pin(self, key):
+        """
+        Pinned assets are loaded right away and never evicted, which is what
+        you want for assets that are used all the time, like the player ship
+        """
+        self.__pinned.add(key)
+        if is_sound(key):
+            self.get_sound(key)
+        else:
+            self.get_graphics(key)
+
+    def unpin(self, key):
+        self.__pinned.discard(key)
+        self.__evict()
+
+    def release(self, key):
+        """
+        Drops an asset from the cache, unless it is pinned. It will be loaded
+        again the next time it is asked for.
+        """
+        if key in self.__sizes and key not in self.__pinned:
+            self.__remove(key)
+
+    def retain(self, keys):
+        """
+        Releases every asset that is neither among the given keys nor pinned.
+        Without a budget everything is kept, since it all fits anyway.
+        """
+        if self.__budget is None:
+            return
+        keep = set(keys)
+        for key in list(self.__sizes):
+            if key not in keep:
+                self.release(key)
+
+    def get_stats(self):
+        """
+        Statistics for the cache, as a dictionary. Hits and misses count
+        get_graphics and get_sound calls, assets loaded by preloading are not
+        counted as misses.
+        """
+        return { 'hits' : self.__hits
+               , 'misses' : self.__misses
+               , 'evictions' : self.__evictions
+               , 'resident_bytes' : self.__resident
+               , 'resident_assets' : len(self.__sizes)
+               , 'pinned' : len(self.__pinned)
+               , 'budget' : self.__budget
+               }
+
+    def __add(self, store, key, asset):
+        size = asset_size(asset)
+        store[key] = asset
+        self.__sizes[key] = size
+        self.__resident += size
+        if store is self.__graphics:
+            self.__prescale(key, asset)
+        self.__evict(key)
+
+    def __prescale(self, key, image):
+        """
+        Scales an image to the window, or takes it from the pixel cache if it
+        has been scaled before. Scaled images count to the size of the asset.
+        """
+        if self.__scale == 1:
+            return
+        scaled = None
+        fmt = display_format()
+        if self.__cache is not None:
+            scaled = read_cache(key, self.__cache, fmt, self.__scale)
+        if scaled is not None:
+            scaled = scaled.convert_alpha()
+        else:
+            scaled = smoothscale(image, scale_size(image.get_size(),
+                                                   self.__scale))
+            if self.__cache is not None:
+                try:
+                    write_cache(key, self.__cache, fmt, scaled, self.__scale)
+                except (IOError, OSError):
+                    pass
+        self.__scaled[key] = scaled
+        self.__keys[image] = key
+        size = asset_size(scaled)
+        self.__sizes[key] += size
+        self.__resident += size
+
+    def __touch(self, key):
+        """ Marks an asset as the most recently used one """
+        self.__hits += 1
+        if self.__budget is not None:
+            self.__sizes[key] = self.__sizes.pop(key)
+
+    def __remove(self, key):
+        self.__resident -= self.__sizes.pop(key)
+        image = self.__graphics.pop(key, None)
+        self.__sound.pop(key, None)
+        self.__scaled.pop(key, None)
+        self.__keys.pop(image, None)
+
+    def __evict(self, keep = None):
+        """
+        Evicts least recently used assets until the cache fits its budget. The
+        asset given as keep is never evicted, it is the one just loaded.
+        """
+        if self.__budget is None:
+            return
+        for key in list(self.__sizes):
+            if self.__resident <= self.__budget:
+                break
+            if key != keep and key not in self.__pinned:
+                self.__remove(key)
+                self.__evictions += 1
+
+    def __write_cache(self, key, image):
+        """
+        Stores the converted pixels of an image in the pixel cache. Failing to
+        do so is not an error, the image will simply be decoded again next time
+        """
+        if self.__cache is None:
+            return
+        try:
+            write_cache(key, self.__cache, display_format(), image)
+        except (IOError, OSError):
+            pass
+
+#
+# Functions below are run on worker threads by preload_all, so they may not
+# touch the display or the mixer.
+#
+
+def decode_image(key, cache, fmt):
+    """
+    Decodes an image file into a surface that is not yet converted. If there
+    is a valid entry in the pixel cache, the surface is built directly on top
+    of the memory mapped pixels instead.
+    """
+    start = time()
+    image = None
+    if cache is not None:
+        image = read_cache(key, cache, fmt)
+    cached = image is not None
+    if not cached:
+        image = load(key)
+    return (key, image, time() - start, cached)
+
+def is_sound(key):
+    return key.lower().endswith(".wav")
+
+def asset_size(asset):
+    """
+    Approximate memory used by an asset. For images that is the number of
+    pixels times the bytes per pixel, for sounds the number of samples times
+    the bytes per sample, in the format the mixer was initialized with.
+    """
+    if isinstance(asset, Sound):
+        (frequency, fmt, channels) = get_init()
+        sample = abs(fmt) // 8 * channels
+        return int(asset.get_length() * frequency) * sample
+    (width, height) = asset.get_size()
+    return width * height * asset.get_bytesize()
+
+def display_format():
+    """ The bit size and masks of the display, which converted images use """
+    surface = get_surface()
+    return (surface.get_bitsize(),) + tuple(surface.get_masks())
+
+def scale_size(size, scale):
+    """ The size of an image of the given size when scaled """
+    return tuple(max(1, int(round(length * scale))) for length in size)
+
+def cache_file(key, cache, scale = 1):
+    """ The pixel cache file of an image, scaled as given """
+    name = key.replace("/", "_").replace("\\", "_")
+    if scale != 1:
+        name += "@%.4f" % scale
+    return join(cache, name + ".pix")
+
+def read_cache(key, cache, fmt, scale = 1):
+    """
+    Returns a surface from the pixel cache, or None if the image has no entry
+    or if the entry is stale, either because the image file has changed or
+    because the display format has. The image is scaled as given.
+    """
+    name = cache_file(key, cache, scale)
+    if not isfile(name):
+        return None
+    source = stat(key)
+    f = open(name, "rb")
+    try:
+        header = f.read(CACHE_HEADER.size)
+        if len(header) != CACHE_HEADER.size:
+            return None
+        values = CACHE_HEADER.unpack(header)
+        (magic, width, height, mtime, size) = values[:5]
+        length = width * height * 4
+        if (magic != CACHE_MAGIC or mtime != source.st_mtime or
+            size != source.st_size or values[5:] != fmt or
+            stat(name).st_size != ALLOCATIONGRANULARITY + length):
+            return None
+        pixels = mmap(f.fileno(), length, access = ACCESS_READ,
+                      offset = ALLOCATIONGRANULARITY)
+    finally:
+        f.close()
+    # The surface keeps the mapping alive for as long as it is needed
+    return frombuffer(pixels, (width, height), "RGBA")
+
+def write_cache(key, cache, fmt, image, scale = 1):
+    """
+    Writes the pixels of a converted image to the pixel cache, as the image
+    of the given key scaled as given. Other processes may have the file
+    mapped, see read_cache, and cutting a mapped file short crashes them, so
+    the file is written under another name and then renamed into place.
+    """
+    if not isdir(cache):
+        makedirs(cache)
+    source = stat(key)
+    (width, height) = image.get_size()
+    header = CACHE_HEADER.pack(CACHE_MAGIC, width, height, source.st_mtime,
+                               source.st_size, *fmt)
+    name = cache_file(key, cache, scale)
+    temporary = name + ".%d.tmp" % getpid()
+    try:
+        f = open(temporary, "wb")
+        try:
+            f.write(header)
+            f.write(b"\0" * (ALLOCATIONGRANULARITY - len(header)))
+            f.write(tostring(image, "RGBA"))
+        finally:
+            f.close()
+        replace(temporary, name)
+    except (IOError, OSError):
+        if isfile(temporary):
+            remove(temporary)
+        raise
+
+def read_sound(key):
+    """ Reads the raw contents of a sound file """
+    start = time()
+    f = open(key, "rb")
+    data = f.read()
+    f.close()
+    return (key, data, time() - start)
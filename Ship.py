@@ -22,10 +22,10 @@ from os.path import join
 
 import pygame
 from Vec2d import Vec2d
-from Shadows import add_shadow
+from Render import BLIT, SHADOW, CIRCLE, SURFACES
 
 from Common import GFX_PATH, SND_PATH
-from VecSprite import VecSprite
+from VecSprite import VecSprite, pixel
 
 class Ship (VecSprite):
     """
@@ -36,11 +36,18 @@ class Ship (VecSprite):
 
     explosionsound = join(SND_PATH,"explosion.wav")
     hitsound = join(SND_PATH,"hit.wav")
+    # Graphics and sounds this kind of ship may use, see Level.manifest
+    assets = [explosionsound, hitsound]
+    # Hit surfaces by image and angle, for ships restored from a snapshot
+    hitsurfaces = {}
 
     # Init_position, init_direction an size are all pairs
     def __init__(self, common, init_pos, init_dir, img_file, speed):
-        self.common = (self.surface, self.res, self.options) = common
+        self.common = common
+        (self.surface, self.res, self.options, self.effects,
+         self.render) = common
         img = self.res.get_graphics(img_file)
+        self.__file = img_file
 
         # Initialize the VecSprite superclass
         super(Ship, self).__init__(init_pos, init_dir, img, speed)
@@ -55,8 +62,9 @@ class Ship (VecSprite):
         # When a ship is hit, it should flash (with yellow)
         self.__hit = False
 
-        # The hitsurface is an overlay drawn when the ship is hit
-        self.__hitsurface = self.image.copy()
+        # The hitsurface is an overlay drawn when the ship is hit. Nothing
+        # is drawn when the game is not rendered, so then there is none.
+        self.__hitsurface = None
         self.calculate_hitsurface()
         
         # Ship statistics
@@ -90,7 +98,7 @@ class Ship (VecSprite):
             self.__strafe.x * self.speed,
             self.__strafe.y * self.speed)
         self.position += displacement
-        self.rect.center = self.get_position()
+        self.rect.center = pixel(self.get_position())
         
     def calculate_hitsurface(self):
         """
@@ -100,9 +108,12 @@ class Ship (VecSprite):
         The existing mask attribute is not used, since it might change due to
         wanting collision detection to only look at a specific hitbox or so
         """
-        self.__hitsurface = self.image.copy()
+        if not self.render:
+            return
+        with SURFACES:
+            self.__hitsurface = self.image.copy()
+            mask = pygame.mask.from_surface(self.image)
         self.__hitsurface.set_alpha(128) # 50 % transparent
-        mask = pygame.mask.from_surface(self.image)
         for x in range(self.image.get_width()):
             for y in range(self.image.get_height()):
                 if mask.get_at((x, y)) != 0:
@@ -110,12 +121,40 @@ class Ship (VecSprite):
                     color = (42, 127, 255, 128) 
                     self.__hitsurface.set_at((x, y), color)
 
-    def set_target(self, (x, y)):
+    def get_record(self):
+        """ Adds the movement and damage of the ship to the VecSprite record """
+        strafe = self.__strafe
+        return (super(Ship, self).get_record(),
+                (self.__file, strafe.x, strafe.y, self.__strafe_angle,
+                 self.__target, self.__hit, self.__damage, self.__max_damage,
+                 self.__exploding, self.__explode_counter))
+
+    def set_record(self, record):
+        (sprite, ship) = record
+        (self.__file, x, y, self.__strafe_angle, self.__target, self.__hit,
+         self.__damage, self.__max_damage, self.__exploding,
+         self.__explode_counter) = ship
+        image = self.res.get_graphics(self.__file)
+        super(Ship, self).set_record(sprite, image)
+        self.__strafe = Vec2d(x, y)
+        self.__hitsurface = None
+        if self.render:
+            # Making the hit surface is slow, so each one is only made once
+            key = (image, self.get_angle())
+            if key not in Ship.hitsurfaces:
+                if len(Ship.hitsurfaces) >= 500:
+                    Ship.hitsurfaces.clear()
+                self.calculate_hitsurface()
+                Ship.hitsurfaces[key] = self.__hitsurface
+            self.__hitsurface = Ship.hitsurfaces[key]
+
+    def set_target(self, target):
         """
         Setting a target makes the ship autopilot towards that target. Setting a
         target only affects the strafe vector, so a ship with a target does not
         change its direction (or angle, if you will). 
         """
+        (x, y) = target
         (x_0, y_0) = self.get_position()
         self.__strafe = Vec2d(x-x_0, y-y_0).normalized()
         self.__target = (x, y)
@@ -126,32 +165,41 @@ class Ship (VecSprite):
         """
         return self.__target != None
 
-    def blit(self):
+    def draw(self, ops, shadow = True, flash = True):
         """
-        Lets the ship draw itself. This overrides the default blit by drawing an
-        animation for when the ship explodes, and by adding a drop shadow to the
-        ship before blitting. Also, if the ship was hit, draw the hitsurface
-        overlay.
+        Lets the ship draw itself, by adding to a draw list, see Render.py.
+        When the ship explodes, an animation is drawn instead of the ship, and
+        otherwise, the ship gets a drop shadow. Also, if the ship was hit, draw
+        the hitsurface overlay. The shadow and the overlay can be left out to
+        save time.
         """
         # Animate an explosion
         if self.__exploding:
             # TODO: Use an image/animation instead
-            if self.__explode_counter < 16:
-                width = self.get_width()
-                radius = int(width / 2.0 / (16.0 - self.__explode_counter))
-                pos = map(int, self.get_position())
+            radius = self.advance_explosion()
+            if radius is not None:
+                (x, y) = self.get_position()
                 color = (255, 0, 0) # Red
-                pygame.draw.circle(self.surface, color, pos, radius)
-                self.__explode_counter += 2
-            else: 
-                self.kill()
-        else:
-            # Add a shadow to the image, then blit it in its original position
-            simage = add_shadow(self.image, (10, 10))
-            self.surface.blit(simage, self.rect)
-
-            if self.__hit:
-                self.surface.blit(self.__hitsurface, self.rect)
+                ops.append((CIRCLE, color, (int(x), int(y)), radius))
+            return
+        # The shadow is added to the image when it is painted
+        ops.append((SHADOW if shadow else BLIT, self.image, self.rect.topleft))
+        if self.__hit and flash:
+            ops.append((BLIT, self.__hitsurface, self.rect.topleft))
+
+    def advance_explosion(self):
+        """
+        Moves the explosion on by a frame, and kills the ship once it is over.
+        Returns the radius of the explosion in this frame, or None if it is
+        over. Called by draw(), or on its own if the game is not rendered.
+        """
+        if self.__explode_counter < 16:
+            width = self.get_width()
+            radius = int(width / 2.0 / (16.0 - self.__explode_counter))
+            self.__explode_counter += 2
+            return radius
+        self.kill()
+        return None
 
     #
     # Ship damage
@@ -168,11 +216,7 @@ class Ship (VecSprite):
         self.__damage += damage
         if self.__damage >= self.__max_damage:
             self.__exploding = True
-            # Play a sound for explosion, but only if sound is enabled
-            if self.options.sound:
-                sound = self.res.get_sound(Ship.explosionsound)
-                sound.set_volume(0.2)
-                sound.play()
+            self.effects.play(Ship.explosionsound)
     
     def reset_damage(self):
         """
@@ -202,11 +246,12 @@ class Ship (VecSprite):
     # sprite has the ability to strafe.
     #
 
-    def set_direction(self, (x, y)):
+    def set_direction(self, direction):
         """
         Override, due to strafing abilities
         Setting the direction does not affect the relative strafing angle
         """
+        (x, y) = direction
         super(Ship, self).set_direction((x, y))
         self.set_strafe(self.__strafe_angle)
         self.calculate_hitsurface()
@@ -223,11 +268,12 @@ class Ship (VecSprite):
         self.__strafe_angle = angle_degrees
     strafe = property(get_strafe, set_strafe)
 
-    def set_strafe_composite(self, (x, y)):
+    def set_strafe_composite(self, strafe):
         """
         If you neccessarily have to set a specifik strafe vector, that's fine
         too. The vector will be normalized, however.
         """
+        (x, y) = strafe
         self.__strafe = Vec2d(x, y).normalized()
  
     def mirror_direction_y(self):
@@ -273,3 +319,9 @@ class Animation:
         Returns the currently active image in the collection
         """
         return self.__images[self.__active]
+
+    def get_record(self):
+        return (self.__active, self.__counter)
+
+    def set_record(self, record):
+        (self.__active, self.__counter) = record
@@ -19,12 +19,13 @@ whutshmup. If not, see <http://www.gnu.org/licenses/>.
 
 from os.path import join
 
-from pygame.draw import circle
+from pygame.rect import Rect
 from pygame.surface import Surface
 from pygame.mask import Mask
 
-from Common import GFX_PATH, SND_PATH
-from VecSprite import VecSprite
+from Common import GFX_PATH, SND_PATH, GAME_SIZE
+from Render import BLIT, CIRCLE
+from VecSprite import VecSprite, set_symmetric
 
 #
 # Shorthands for certain common shot types
@@ -50,32 +51,49 @@ class Shot(VecSprite):
     mediumshot = join(GFX_PATH, "shot-16.png")
     largeshot = join(GFX_PATH, "shot-32.png")
     playershot = join(GFX_PATH, "playershot.png")
+    # Shots that are round, and look the same whichever way they go
+    symmetric = [smallshot, mediumshot, largeshot]
     smalldamage = 1
     mediumdamage = 2
     largedamage = 5
     mediumsound = join(SND_PATH, "mediumshot.wav")
-    snipesound = join(SND_PATH, "snipershot.wav")
+    snipesound = join(SND_PATH, "snipeshot.wav")
     playersound = join(SND_PATH, "playershot.wav")
 
     def __init__(self, common, image, init_pos, init_dir, speed, damage, sound):
-        self.common = (self.surface, self.res, self.options) = common
-        img = self.res.get_graphics(image)
+        self.common = common
+        (self.surface, self.res, self.options, self.effects, _) = common
+        img = self.__graphics(image)
+        self.__file = image
         super(Shot, self).__init__(init_pos, init_dir, img, speed)
 
-        # Create and play the sound, we don't need to keep it
-        if sound != None and self.options.sound:
-            sound = self.res.get_sound(sound)
-            sound.set_volume(0.4)
-            sound.play()
+        if sound != None:
+            self.effects.play(sound)
 
         self.__damage = damage
 
-    def blit(self):
-        self.surface.blit(self.image, self.rect)
+    def draw(self, ops):
+        ops.append((BLIT, self.image, self.rect.topleft))
 
     def get_damage(self):
         return self.__damage
 
+    def get_record(self):
+        """ Adds the image and damage of the shot to the VecSprite record """
+        return (super(Shot, self).get_record(), self.__file, self.__damage)
+
+    def set_record(self, record):
+        (sprite, self.__file, self.__damage) = record
+        image = self.__graphics(self.__file)
+        super(Shot, self).set_record(sprite, image)
+
+    def __graphics(self, image):
+        """ The image of a shot, declared symmetric if the shot is round """
+        img = self.res.get_graphics(image)
+        if image in Shot.symmetric:
+            set_symmetric(img)
+        return img
+
 class ClusterShot(Shot):
     """
     ClusterShots explodes into several regular shots after a given timeout
@@ -84,6 +102,8 @@ class ClusterShot(Shot):
     clusterfile = Shot.largeshot
     clusterdamage = 5
     clustersound = join(SND_PATH, "clustershot.wav")
+    # Cluster shots split into small shots, so those are needed as well
+    assets = [clusterfile, clustersound, Shot.smallshot]
 
     def __init__(self, common, init_pos, init_dir, speed, timeout, clusters):
         super(ClusterShot, self).__init__(common, ClusterShot.clusterfile, 
@@ -104,7 +124,7 @@ class ClusterShot(Shot):
             cpos = self.get_position()
             for i in range(self.__clusters):
                 # Angle calculation magic. 360 degree coverage
-                angle = 90 - 180 / self.__clusters * (i-1)
+                angle = 90 - 180 // self.__clusters * (i-1)
                 if i % 2 == 0: 
                     angle -= 180
                 newdir = self.direction.rotated(angle)
@@ -114,6 +134,14 @@ class ClusterShot(Shot):
                     group.add(shot)
             self.kill() # The original shot should die
 
+    def get_record(self):
+        return (super(ClusterShot, self).get_record(), self.__timeout,
+                self.__clusters)
+
+    def set_record(self, record):
+        (shot, self.__timeout, self.__clusters) = record
+        super(ClusterShot, self).set_record(shot)
+
 # TODO: Use mines in the game
 class Mine(Shot):
     """
@@ -135,7 +163,7 @@ class Mine(Shot):
             self.kill()
 
     # TODO: Find a neater way to do this
-    def blit(self):
+    def draw(self, ops):
         """
         If the shot should explode: Paint a blast! Otherwise, just do what any
         other shot would do.
@@ -143,13 +171,17 @@ class Mine(Shot):
         if self.counter >= self.__timeout:
             size = self.__timeout - self.counter
             rad = self.__radius - size
-            pos = map(int, self.get_position())
-            rect = circle(self.surface, (255, 102, 0), pos, rad)
+            (x, y) = self.get_position()
+            pos = (int(x), int(y))
+            ops.append((CIRCLE, (255, 102, 0), pos, rad))
+            # The blast is painted later, so work out what it will cover here
+            rect = Rect(pos[0] - rad, pos[1] - rad, rad * 2, rad * 2)
+            rect = rect.clip(Rect((0, 0), GAME_SIZE))
             self.rect = rect
             self.image = Surface((rect.width, rect.height))
             self.mask = Mask((rect.width, rect.height)) 
             self.mask.fill() # Everything in this mask is set
         else:
-            super(Mine, self).blit()
+            super(Mine, self).draw(ops)
 
 
@@ -0,0 +1,103 @@
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+# Snapshot.py
+#
+# Turning the sprites of a game into plain records and back, so that the game
+# can be snapshot and restored: to rewind it, or to play on from the same
+# point more than once. See GameLogic.snapshot and GameLogic.restore.
+#
+
+from collections import deque
+
+from pygame.sprite import Sprite
+
+from Alien import Enemy, Scout, Alien, Bomber, Chopper, Sniper, Kamikaze
+from Alien import FirstBoss, SecondBoss
+from Level import Level, EndlessLevel, Item
+from Shot import Shot, ClusterShot
+
+# The kinds of sprites that can be restored, by name
+SPRITES = dict((kind.__name__, kind) for kind in
+               [Scout, Alien, Bomber, Chopper, Sniper, Kamikaze, FirstBoss,
+                SecondBoss, Shot, ClusterShot, Item])
+
+def sprite_record(sprite):
+    """ The kind of a sprite and its record, see VecSprite.get_record """
+    return (type(sprite).__name__, sprite.get_record())
+
+def make_sprite(common, player, record):
+    """
+    Makes a sprite from a record. The constructors are not used, since they
+    play sounds, post events and rotate images, which the record already
+    holds the outcome of. Images come from the resources and the rotations
+    cached in VecSprite instead.
+    """
+    (name, state) = record
+    kind = SPRITES[name]
+    sprite = kind.__new__(kind)
+    Sprite.__init__(sprite)
+    sprite.common = common
+    (sprite.surface, sprite.res, sprite.options, sprite.effects,
+     sprite.render) = common
+    if isinstance(sprite, Enemy):
+        sprite.player = player
+    sprite.set_record(state)
+    return sprite
+
+def level_record(level):
+    return (type(level).__name__, level.get_record())
+
+def make_level(record):
+    """
+    A new level from a record, so that levels restored from the same
+    snapshot do not share anything that changes
+    """
+    (name, state) = record
+    level = EndlessLevel() if name == 'EndlessLevel' else Level([])
+    level.set_record(state)
+    return level
+
+class History:
+    """
+    The snapshots of the last ticks of a game, oldest first, to rewind it.
+    Only the given number of snapshots are kept.
+    """
+
+    def __init__(self, length):
+        self.__snapshots = deque(maxlen = length)
+
+    def push(self, snapshot):
+        self.__snapshots.append(snapshot)
+
+    def back(self, ticks):
+        """
+        The snapshot from the given number of ticks ago, or the oldest one if
+        there are not that many. The snapshots after it are dropped. Returns
+        None if there are no snapshots.
+        """
+        if len(self.__snapshots) == 0:
+            return None
+        for _ in range(min(ticks, len(self.__snapshots) - 1)):
+            self.__snapshots.pop()
+        return self.__snapshots[-1]
+
+    def __len__(self):
+        return len(self.__snapshots)
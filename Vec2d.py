@@ -68,6 +68,7 @@ class Vec2d(object):
  
     def __nonzero__(self):
         return bool(self.x or self.y)
+    __bool__ = __nonzero__
  
     # Generic operator handlers
     def _o2(self, other, f):
@@ -179,6 +180,14 @@ class Vec2d(object):
         return self._r_o2(other, operator.div)
     def __idiv__(self, other):
         return self._io(other, operator.div)
+
+    # Python 3 only has true division
+    def __truediv__(self, other):
+        return self._o2(other, operator.truediv)
+    def __rtruediv__(self, other):
+        return self._r_o2(other, operator.truediv)
+    def __itruediv__(self, other):
+        return self._io(other, operator.truediv)
  
     def __floordiv__(self, other):
         return self._o2(other, operator.floordiv)
@@ -18,11 +18,29 @@ whutshmup. If not, see <http://www.gnu.org/licenses/>.
 
 """
 
+from weakref import WeakKeyDictionary
+
 import pygame
 from pygame.sprite import Sprite
 from pygame.rect import Rect
 
 from Vec2d import Vec2d
+from Render import SURFACES
+
+# Rotated images and their masks, by base image and angle, for sprites that
+# are restored from a snapshot. See rotation().
+ROTATIONS = {}
+ROTATIONS_MAX = 2000
+
+# The image and angle that every rotated image was made from, for as long as
+# the rotated image is around. A scaled window paints the rotated images by
+# rotating the scaled images instead, see Graphics.scaled.
+ORIGINS = WeakKeyDictionary()
+
+# Images that look the same at any angle, like round shots, and their masks.
+# Sprites with one of these never rotate it, and all share its mask. See
+# set_symmetric().
+SYMMETRIC = WeakKeyDictionary()
 
 class VecSprite(Sprite):
     """
@@ -48,15 +66,26 @@ class VecSprite(Sprite):
 
         # Load the image and rotate it 
         self.__base_image = image 
-        # Rotate the image CLOCKWISE, hence the negative angle
-        self.image = pygame.transform.rotate(self.__base_image,
-                                             -self.direction.angle)
+        if image in SYMMETRIC:
+            # Rotating would change nothing but the size of the image
+            self.image = image
+            self.mask = SYMMETRIC[image]
+        else:
+            # Rotate the image CLOCKWISE, hence the negative angle
+            # The images may be being painted in another thread, see Render.py
+            with SURFACES:
+                self.image = pygame.transform.rotate(self.__base_image,
+                                                     -self.direction.angle)
+                # Rect attribute
+                self.mask = pygame.mask.from_surface(self.image)
+            ORIGINS[self.image] = (self.__base_image, self.direction.angle)
         self.__image_w, self.__image_h = self.image.get_size() # Rotated size
 
-        # Rect attribute
-        self.mask = pygame.mask.from_surface(self.image)
+        # The mask is not remade when the direction changes, so remember the
+        # angle it was made at, to be able to make it again
+        self.__mask_angle = self.direction.angle
         self.rect = Rect((0, 0), (self.__image_w, self.__image_h))
-        self.rect.center = (self.position.x, self.position.y)
+        self.rect.center = pixel(self.position)
 
         # Misc
         self.__counter = 0
@@ -83,7 +112,7 @@ class VecSprite(Sprite):
             self.direction.x * self.speed,
             self.direction.y * self.speed)
         self.position += displacement
-        self.rect.center = self.position.x, self.position.y
+        self.rect.center = pixel(self.position)
     
     def __recalc(self):
         """
@@ -91,10 +120,43 @@ class VecSprite(Sprite):
         whenever one changes direction or image.
         """
         angle = self.direction.angle
-        self.image = pygame.transform.rotate(self.__base_image, -angle) 
+        if self.__base_image in SYMMETRIC:
+            self.image = self.__base_image
+        else:
+            with SURFACES:
+                self.image = pygame.transform.rotate(self.__base_image, -angle)
+            ORIGINS[self.image] = (self.__base_image, angle)
         self.__image_w, self.__image_h = self.image.get_size()
         self.rect.size = self.__image_w, self.__image_h
-        self.rect.center = self.position.x, self.position.y
+        self.rect.center = pixel(self.position)
+
+    def get_record(self):
+        """
+        The state of the sprite as a tuple of plain values, to put it back the
+        way it was with set_record(). Subclasses add their own state to it.
+        """
+        return (self.position.x, self.position.y, self.direction.x,
+                self.direction.y, self.__speed, self.__counter,
+                self.__mask_angle)
+
+    def set_record(self, record, image, mask_image = None):
+        """
+        Puts the sprite back in the state of a record, with the given image,
+        which has to be the one the sprite had. The mask was made from another
+        image if the image has been changed since, see set_image.
+        """
+        (x, y, dx, dy, speed, counter, mask_angle) = record
+        self.position = Vec2d(x, y)
+        self.direction = Vec2d(dx, dy)
+        self.__speed = speed
+        self.__counter = counter
+        self.__mask_angle = mask_angle
+        self.__base_image = image
+        (self.image, _) = rotation(image, self.direction.angle)
+        (_, self.mask) = rotation(mask_image or image, mask_angle)
+        self.__image_w, self.__image_h = self.image.get_size()
+        self.rect = Rect((0, 0), (self.__image_w, self.__image_h))
+        self.rect.center = pixel((x, y))
 
     def get_counter(self):
         """
@@ -109,8 +171,10 @@ class VecSprite(Sprite):
         This method should be used to manipulate which image is used for the
         sprite. Don't set the image attribute directly.
         """
-        self.__base_image = image.convert_alpha()
-        self.mask = pygame.mask.from_surface(self.image)
+        with SURFACES:
+            self.__base_image = image.convert_alpha()
+            self.mask = pygame.mask.from_surface(self.image)
+        self.__mask_angle = self.direction.angle
         self.__recalc()
 
     def get_angle(self):
@@ -128,12 +192,13 @@ class VecSprite(Sprite):
         """
         return self.direction.x, self.direction.y
 
-    def set_direction(self, (x, y)):
+    def set_direction(self, direction):
         """
         The point of not letting someone mess with the vector directly is that
         when direction is set, the image this sprite represents has to be
         rotated and some calculations have to be made.
         """
+        (x, y) = direction
         self.direction = Vec2d(x, y).normalized()
         self.__recalc()
 
@@ -158,13 +223,14 @@ class VecSprite(Sprite):
         """
         return self.position.x, self.position.y
 
-    def set_position(self, (x, y)):
+    def set_position(self, position):
         """
         Just like with the direction, setting the position has effects for other
         parts of the vector. 
         """
+        (x, y) = position
         self.position = Vec2d(x, y)
-        self.rect.center = x, y
+        self.rect.center = pixel((x, y))
 
     def get_width(self):
         """
@@ -189,3 +255,37 @@ class VecSprite(Sprite):
         """
         self.__speed = speed
     speed = property(get_speed, set_speed)
+
+def pixel(position):
+    """
+    The pixel a position is in, to place a rect at. Rects in pygame 1 cut off
+    the fractions of positions, while pygame 2 rounds them, so the fractions
+    are cut off here to place sprites the same with either.
+    """
+    return (int(position[0]), int(position[1]))
+
+def set_symmetric(image):
+    """
+    Declares that an image looks the same however it is rotated, so that
+    sprites with it skip rotating it and share one mask, made here, once
+    """
+    if image not in SYMMETRIC:
+        with SURFACES:
+            SYMMETRIC[image] = pygame.mask.from_surface(image)
+
+def rotation(image, angle):
+    """
+    An image rotated the way a sprite with the given angle shows it, and its
+    mask, made only once for each image and angle
+    """
+    if image in SYMMETRIC:
+        return (image, SYMMETRIC[image])
+    key = (image, angle)
+    if key not in ROTATIONS:
+        if len(ROTATIONS) >= ROTATIONS_MAX:
+            ROTATIONS.clear()
+        with SURFACES:
+            rotated = pygame.transform.rotate(image, -angle)
+            ROTATIONS[key] = (rotated, pygame.mask.from_surface(rotated))
+        ORIGINS[rotated] = key
+    return ROTATIONS[key]
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License along with 
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# audio_latency.py
+#
+# Measures the delay from triggering a sound effect until it is output, for
+# every buffer size the game can choose from. Uses the SDL disk audio driver,
+# so no sound card is needed.
+#
+#   python bench/audio_latency.py [frequency] [trials]
+#
+
+import json
+import os
+import sys
+from os.path import abspath, dirname
+from tempfile import gettempdir
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(gettempdir())
+
+from Audio import BUFFER_SIZES, buffer_time, choose_buffer, measure_latency
+
+def main():
+    frequency = int(sys.argv[1]) if len(sys.argv) > 1 else 44100
+    trials = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    report = { 'frequency' : frequency
+             , 'chosen_buffer' : choose_buffer(frequency)
+             , 'buffers' : {}
+             }
+    for size in BUFFER_SIZES:
+        report['buffers'][str(size)] = {
+            'buffer_s' : buffer_time(size, frequency),
+            'latency_s' : measure_latency(frequency, size, trials)
+        }
+    print(json.dumps(report, indent = 2, sort_keys = True))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# batch.py
+#
+# Plays a level many times over without rendering, spread over a pool of
+# processes, to see how the game plays with other speeds. Every combination
+# of the given ship, enemy and shot speeds is played with a number of random
+# input policies, and each game is reported as one JSON line as soon as it
+# is done. A summary with the clear rate of each combination is printed last.
+#
+#   python bench/batch.py [--level N] [--policies N] [--ticks N]
+#                         [--shipspeed S,...] [--enemyspeed S,...]
+#                         [--shotspeed S,...] [--processes N]
+#                         [--output FILE] [--branch DISTANCE|boss]
+#
+# The enemy speed is that of enemies the level gives no speed of their own.
+# Each game only depends on its level, policy and speeds, so a record can be
+# played again alone, whichever process it was played in.
+#
+# With --branch, the games start from a checkpoint instead of from the start
+# of the level: the level is played once by the scripted player of
+# fastforward.py, which cannot die, up to the given distance or until a boss
+# shows up. The game is snapshot there with three lives left, and every game
+# is restored from the snapshot. Lives lost, damage taken and shots fired
+# are then counted from the checkpoint.
+#
+
+import json
+import multiprocessing
+import sys
+from itertools import product
+from random import Random
+from timeit import default_timer as clock
+
+from suite import start
+from fastforward import sweep
+
+from pygame.event import clear
+
+from Alien import Boss
+from Common import RUNNING, CLEARED, DIED, SHIPSPEED, ENEMYSPEED, SHOTSPEED
+from Level import level_convert, between, pick
+from Replay import UP, DOWN, LEFT, RIGHT, FIRE, LAST_SHIFT
+
+# What each record holds, in order
+FIELDS = ['level', 'policy', 'shipspeed', 'enemyspeed', 'shotspeed',
+          'outcome', 'ticks', 'lives_lost', 'damage_taken', 'shots_fired']
+
+OUTCOMES = { CLEARED : 'cleared', DIED : 'died', RUNNING : 'timeout' }
+
+# The game of each worker process, set up once by setup()
+GAME = None
+# Snapshots to branch from, by level, branch point and speeds, per worker
+CHECKPOINTS = {}
+
+def setup():
+    """ Starts pygame, loads the resources and makes the game of a worker """
+    global GAME
+    GAME = start(render = False)
+
+def policy(seed):
+    """
+    A random input policy: hold a random set of arrows for a random number of
+    ticks, firing most of the time, then pick new ones. Yields the input of
+    each tick, see GameLogic.set_input.
+    """
+    rand = Random(seed)
+    arrows = [UP, DOWN, LEFT, RIGHT]
+    while True:
+        held = [i for i in range(4) if rand.random() < 0.3]
+        bits = sum(arrows[i] for i in held)
+        if len(held) > 0:
+            bits |= pick(rand, held) << LAST_SHIFT
+        if rand.random() < 0.8:
+            bits |= FIRE
+        for _ in range(between(rand, 5, 40)):
+            yield bits
+
+def begin(level):
+    """ Starts the level over with a new player """
+    (logic, graphics, _) = GAME
+    # Events of the last game, like its player dying, must not leak into this
+    clear()
+    logic.add_player()
+    logic.clear()
+    graphics.reset_distance()
+    graphics.set_scroll(5)
+    logic.set_level(level_convert()[level])
+
+def reached(branch):
+    """ Whether the game has got as far as the branch point """
+    (logic, graphics, _) = GAME
+    if branch == 'boss':
+        return any(isinstance(enemy, Boss) for enemy in logic.get_enemies())
+    return graphics.get_total_distance() >= int(branch)
+
+def checkpoint(level, branch, key):
+    """
+    A snapshot of the game at the branch point, made the first time it is
+    asked for in this worker
+    """
+    if key not in CHECKPOINTS:
+        logic = GAME[0]
+        begin(level)
+        player = logic.get_player()
+        player.lives = 10**6
+        tick = 0
+        while not reached(branch):
+            logic.set_input(sweep(tick))
+            tick += 1
+            if not logic.step() or logic.get_state() != RUNNING:
+                raise ValueError("Level %d ends before %s" % (level, branch))
+        player.lives = 3
+        CHECKPOINTS[key] = logic.snapshot()
+    return CHECKPOINTS[key]
+
+def play(job):
+    """ Plays one game in a worker, and returns its record as a tuple """
+    (level, seed, shipspeed, enemyspeed, shotspeed, ticks, branch) = job
+    (logic, graphics, options) = GAME
+    options.shipspeed = shipspeed
+    options.enemyspeed = enemyspeed
+    options.shotspeed = shotspeed
+    if branch is None:
+        begin(level)
+    else:
+        logic.restore(checkpoint(level, branch, job[:1] + job[2:5] + job[6:]))
+    player = logic.get_player()
+    (lives, damage, shots) = (player.lives, player.damage_taken,
+                              player.shots_fired)
+
+    tick = 0
+    inputs = policy(seed)
+    while tick < ticks:
+        logic.set_input(next(inputs))
+        tick += 1
+        if not logic.step() or logic.get_state() != RUNNING:
+            break
+    outcome = OUTCOMES.get(logic.get_state(), 'aborted')
+    return (level, seed, shipspeed, enemyspeed, shotspeed, outcome, tick,
+            lives - player.lives, player.damage_taken - damage,
+            player.shots_fired - shots)
+
+def speeds(text):
+    return [int(s) for s in text.split(',')]
+
+def main():
+    args = sys.argv[1:]
+    level, policies, ticks, processes, output = 0, 100, 20000, None, None
+    branch = None
+    values = { 'ship' : [SHIPSPEED], 'enemy' : [ENEMYSPEED],
+               'shot' : [SHOTSPEED] }
+    while args:
+        arg = args.pop(0)
+        if arg == '--level':
+            level = int(args.pop(0))
+        elif arg == '--policies':
+            policies = int(args.pop(0))
+        elif arg == '--ticks':
+            ticks = int(args.pop(0))
+        elif arg == '--processes':
+            processes = int(args.pop(0))
+        elif arg == '--output':
+            output = args.pop(0)
+        elif arg == '--branch':
+            branch = args.pop(0)
+        elif arg in ['--shipspeed', '--enemyspeed', '--shotspeed']:
+            values[arg[2:-5]] = speeds(args.pop(0))
+        else:
+            sys.exit("Unknown argument: %s" % arg)
+
+    jobs = [(level, seed, ship, enemy, shot, ticks, branch)
+            for (ship, enemy, shot) in product(values['ship'],
+                                               values['enemy'],
+                                               values['shot'])
+            for seed in range(policies)]
+    processes = processes or multiprocessing.cpu_count()
+    out = open(output, "w") if output else None
+    # Clear rate and totals per combination of speeds
+    combinations = {}
+    started = clock()
+    pool = multiprocessing.Pool(processes, setup)
+    try:
+        chunksize = max(1, min(16, len(jobs) // (processes * 4)))
+        for record in pool.imap_unordered(play, jobs, chunksize):
+            if out:
+                out.write(json.dumps(dict(zip(FIELDS, record))) + "\n")
+                out.flush()
+            key = "%d/%d/%d" % record[2:5]
+            total = combinations.setdefault(key, { 'games' : 0
+                                                 , 'cleared' : 0
+                                                 , 'died' : 0
+                                                 , 'ticks' : 0
+                                                 })
+            total['games'] += 1
+            total['ticks'] += record[6]
+            if record[5] in ['cleared', 'died']:
+                total[record[5]] += 1
+    finally:
+        pool.close()
+        pool.join()
+        if out:
+            out.close()
+    elapsed = clock() - started
+
+    for total in combinations.values():
+        total['clear_rate'] = total['cleared'] / float(total['games'])
+    played = sum(t['ticks'] for t in combinations.values())
+    report = { 'level' : level
+             , 'branch' : branch
+             , 'games' : len(jobs)
+             , 'processes' : processes
+             , 'seconds' : elapsed
+             , 'games_per_second' : len(jobs) / elapsed
+             , 'ticks_per_second' : played / elapsed
+             , 'speeds' : combinations
+             }
+    print(json.dumps(report, indent = 2, sort_keys = True))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# fastforward.py
+#
+# Plays through every level of the game without rendering anything, with a
+# scripted player that fires all the time and sweeps across the screen, and
+# reports how each level went and how many ticks per second were simulated,
+# as JSON. The player cannot die unless --mortal is given. Exits with status
+# 1 if any level was not cleared within the tick limit, so it can be used to
+# check that changed levels can still be played through.
+#
+#   python bench/fastforward.py [--ticks N] [--mortal] [--endless SEED]
+#
+
+import json
+import sys
+from timeit import default_timer as clock
+
+from suite import start, peak_memory
+
+from Common import RUNNING, CLEARED
+from Level import EndlessLevel, level_convert
+from Replay import LEFT, RIGHT, FIRE
+
+def sweep(tick):
+    """ The input of the scripted player in a tick, see GameLogic.set_input """
+    phase = tick % 240
+    if phase < 100:
+        return FIRE | LEFT
+    elif 120 <= phase < 220:
+        return FIRE | RIGHT
+    return FIRE
+
+def play_level(logic, graphics, level, ticks):
+    logic.clear()
+    graphics.reset_distance()
+    graphics.set_scroll(5)
+    logic.set_level(level)
+    begin = clock()
+    tick = 0
+    while tick < ticks:
+        logic.set_input(sweep(tick))
+        if not logic.step() or logic.get_state() != RUNNING:
+            break
+        tick += 1
+    elapsed = clock() - begin
+    return { 'state' : logic.get_state()
+           , 'cleared' : logic.get_state() == CLEARED
+           , 'ticks' : tick
+           , 'seconds' : elapsed
+           , 'ticks_per_second' : tick / elapsed if elapsed > 0 else None
+           , 'distance' : graphics.get_total_distance()
+           , 'lives_left' : logic.get_player().lives
+           }
+
+def main():
+    args = sys.argv[1:]
+    ticks, mortal, seed = 50000, False, None
+    while args:
+        arg = args.pop(0)
+        if arg == '--ticks':
+            ticks = int(args.pop(0))
+        elif arg == '--mortal':
+            mortal = True
+        elif arg == '--endless':
+            seed = int(args.pop(0))
+        else:
+            sys.exit("Unknown argument: %s" % arg)
+
+    (logic, graphics, _) = start(render = False)
+    if not mortal:
+        logic.get_player().lives = 10**6
+    if seed is None:
+        levels = level_convert()
+    else:
+        levels = [EndlessLevel(seed)]
+
+    results = []
+    for level in levels:
+        results.append(play_level(logic, graphics, level, ticks))
+        if not results[-1]['cleared']:
+            break
+    total_ticks = sum(r['ticks'] for r in results)
+    total_time = sum(r['seconds'] for r in results)
+    report = { 'levels' : results
+             , 'cleared' : all(r['cleared'] for r in results) and
+                           len(results) == len(levels)
+             , 'ticks' : total_ticks
+             , 'ticks_per_second' : total_ticks / total_time
+                                    if total_time > 0 else None
+             , 'peak_memory_bytes' : peak_memory()
+             }
+    print(json.dumps(report, indent = 2, sort_keys = True))
+    # An endless level is never cleared, so only the campaign can fail
+    if seed is None and not report['cleared']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License along with 
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# menu_idle.py
+#
+# Measures how much CPU the menus use while waiting for the player, both for
+# a static menu and for one that is repainted every frame. Runs without a
+# display using the SDL dummy drivers.
+#
+#   python bench/menu_idle.py [seconds]
+#
+
+import json
+import os
+import sys
+from os.path import abspath, dirname
+from time import time
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from pygame.locals import QUIT, K_RETURN
+
+from Controller import wait_for_key
+from Graphics import Graphics
+from Options import Options
+from Resources import Resources
+
+def cpu_time():
+    (user, system) = os.times()[:2]
+    return user + system
+
+def measure(seconds, paint):
+    """
+    Waits in a menu until a timer closes the window, and returns the CPU time
+    used as a fraction of the time waited
+    """
+    pygame.event.clear()
+    pygame.time.set_timer(QUIT, int(seconds * 1000))
+    wall, cpu = time(), cpu_time()
+    wait_for_key([K_RETURN], paint)
+    wall, cpu = time() - wall, cpu_time() - cpu
+    pygame.time.set_timer(QUIT, 0)
+    return { 'wall_s' : wall, 'cpu_s' : cpu, 'cpu_percent' : 100 * cpu / wall }
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    pygame.init()
+    graphics = Graphics(Resources(None), Options())
+    entries = ["Start game", "Endless mode", "Instructions", "Options", "Quit"]
+    graphics.main_menu(entries, 0)
+    report = { 'static' : measure(seconds, None)
+             , 'animated' : measure(seconds, 
+                                    lambda: graphics.main_menu(entries, 0))
+             }
+    print(json.dumps(report, indent = 2, sort_keys = True))
+    pygame.quit()
+
+if __name__ == '__main__':
+    main()
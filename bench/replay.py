@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# replay.py
+#
+# Plays back a recording of a level, made with RECORD_PATH set in Common.py,
+# as fast as it can and without a display. The state of the game is compared
+# to the recording after every tick, so a replay that does not go exactly the
+# way the game did is reported, with the tick where it first went astray.
+# Reports ticks per second and frame time percentiles as JSON, like suite.py.
+#
+#   python bench/replay.py FILE [--no-check] [--render-thread]
+#                          [--resolution WIDTHxHEIGHT]
+#
+# With --render-thread, frames are painted and flipped in a thread of their
+# own, see Render.py. Either way, the time from when the draw list of a
+# frame was made until it was flipped is reported as present_ms. With
+# --resolution, the game is played in a window of that size, scaled.
+#
+# A recording can also be made without a keyboard, from the input script of
+# the level1 scenario in suite.py:
+#
+#   python bench/replay.py --record FILE [ticks]
+#
+
+import json
+import sys
+from timeit import default_timer as clock
+
+from suite import start, weave, milliseconds, peak_memory
+
+from pygame.event import Event, post
+from pygame.locals import KEYDOWN, KEYUP
+
+from Common import RUNNING
+from Level import level_convert
+from Options import parse_resolution
+from Replay import Recording, replay
+
+def play_back(filename, check, threaded = False, resolution = None):
+    recording = Recording.load(filename)
+    (logic, graphics, _) = start(resolution = resolution)
+    if threaded:
+        logic.enable_render_thread()
+    profiler = logic.enable_profiler(False, None)
+    begin = clock()
+    mismatch = replay(logic, graphics, recording, check)
+    logic.get_presenter().wait()
+    elapsed = clock() - begin
+    present = logic.get_presenter().report()
+    logic.disable_render_thread()
+
+    report = profiler.report()
+    frames = profiler.get_frames()
+    return { 'recorded_ticks' : len(recording)
+           , 'ticks' : frames
+           , 'seconds' : elapsed
+           , 'ticks_per_second' : frames / elapsed if elapsed > 0 else None
+           , 'frame_ms' : milliseconds(report.pop('frame', None))
+           , 'phases_ms' : dict((phase, milliseconds(stats))
+                                for (phase, stats) in report.items())
+           , 'checked' : check
+           , 'deterministic' : mismatch is None if check else None
+           , 'first_mismatch' : mismatch
+           , 'render_thread' : threaded
+           , 'scale' : graphics.get_scale()
+           , 'present_ms' : present['latency_ms']
+           , 'present_blocked_ms' : present['blocked_ms']
+           , 'counts' : logic.get_counts()
+           , 'peak_memory_bytes' : peak_memory()
+           }
+
+def record(filename, ticks):
+    """ Records the first level played with the weave input script """
+    (logic, graphics, options) = start()
+    logic.set_level(level_convert()[0])
+    recording = Recording(0, 0, logic.get_player())
+    logic.set_recording(recording)
+    held = set()
+    for tick in range(ticks):
+        keys = weave(options, tick)
+        for key in sorted(keys - held):
+            post(Event(KEYDOWN, key = key))
+        for key in sorted(held - keys):
+            post(Event(KEYUP, key = key))
+        held = keys
+        if not logic.step() or logic.get_state() != RUNNING:
+            break
+    recording.save(filename)
+    return { 'recorded_ticks' : len(recording), 'counts' : logic.get_counts() }
+
+USAGE = ("usage: replay.py FILE [--no-check] [--render-thread] "
+         "[--resolution WIDTHxHEIGHT] | --record FILE [ticks]")
+
+def main():
+    args = sys.argv[1:]
+    if len(args) == 0:
+        sys.exit(USAGE)
+    if args[0] == '--record':
+        ticks = int(args[2]) if len(args) > 2 else 20000
+        report = record(args[1], ticks)
+    else:
+        resolution = None
+        if '--resolution' in args:
+            index = args.index('--resolution') + 1
+            if index < len(args):
+                resolution = parse_resolution(args[index])
+            if resolution is None:
+                sys.exit(USAGE)
+        report = play_back(args[0], '--no-check' not in args,
+                           '--render-thread' in args, resolution)
+    print(json.dumps(report, indent = 2, sort_keys = True))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License along with 
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# soak.py
+#
+# Goes from the main menu into a game and back again, over and over, and
+# reports how memory use develops. Memory should stay flat, since every game
+# is freed when it is left. Runs without a display using the SDL dummy drivers.
+#
+#   python bench/soak.py [cycles]
+#
+
+import gc
+import json
+import os
+import sys
+from os.path import abspath, dirname, join
+from tempfile import mkdtemp
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from pygame.event import Event, post
+from pygame.locals import KEYDOWN
+
+from Controller import Controller
+from Logic import GameLogic
+from Options import Options
+
+def resident_bytes():
+    """ Resident set size of this process, on Linux only """
+    try:
+        f = open("/proc/self/statm")
+        pages = int(f.read().split()[1])
+        f.close()
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError):
+        return None
+
+def sample(cycle):
+    gc.collect()
+    objects = gc.get_objects()
+    return { 'cycle' : cycle
+           , 'objects' : len(objects)
+           , 'game_logics' : len([o for o in objects 
+                                  if isinstance(o, GameLogic)])
+           , 'resident_bytes' : resident_bytes()
+           }
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    # Keep the options away from the player's own, and the music off, since
+    # it would only queue up fades much faster than they are played
+    Options.optionsfile = join(mkdtemp(), "options.dat")
+    options = Options()
+    options.music = False
+    options.audio_buffer = 2048
+    options.save()
+
+    control = Controller()
+    samples = []
+    screen = control.main_menu
+    for cycle in range(cycles):
+        if cycle % max(1, cycles // 10) == 0:
+            samples.append(sample(cycle))
+        # Start a game from the main menu, then abort it straight away
+        post(Event(KEYDOWN, key = options.confirm))
+        screen = screen()
+        post(Event(KEYDOWN, key = options.abort))
+        screen = screen()
+    samples.append(sample(cycles))
+    control.quit()
+
+    first, last = samples[1] if len(samples) > 2 else samples[0], samples[-1]
+    report = { 'cycles' : cycles
+             , 'samples' : samples
+             , 'object_growth' : last['objects'] - first['objects']
+             , 'game_logics_alive' : last['game_logics']
+             }
+    print(json.dumps(report, indent = 2, sort_keys = True))
+
+if __name__ == '__main__':
+    main()
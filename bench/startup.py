@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+ 
+You should have received a copy of the GNU General Public License along with 
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# startup.py
+#
+# Compares the time it takes to preload all resources without the pixel
+# cache, with an empty pixel cache (cold) and with a filled one (warm). Runs
+# without a display using the SDL dummy drivers.
+#
+#   python bench/startup.py [rounds]
+#
+
+import json
+import os
+import sys
+from os.path import abspath, dirname, join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from Common import WINDOW_SIZE, GFX_PATH
+from Resources import Resources
+
+def preload(cache):
+    res = Resources(cache)
+    total = res.preload_all()
+    return total, res.get_load_times()
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    pygame.mixer.pre_init(frequency = 44100, buffer = 2048)
+    pygame.init()
+    pygame.display.set_mode(WINDOW_SIZE)
+
+    bg = join(GFX_PATH, "BG-bluepattern.png")
+    results = {"uncached" : [], "cold" : [], "warm" : []}
+    background = {"uncached" : [], "cold" : [], "warm" : []}
+    for _ in range(rounds):
+        cache = mkdtemp()
+        try:
+            for (name, path) in [("uncached", None), ("cold", cache),
+                                 ("warm", cache)]:
+                total, times = preload(path)
+                results[name].append(total)
+                background[name].append(times[bg])
+        finally:
+            rmtree(cache)
+
+    report = {}
+    for name in results:
+        report[name] = { "total_s" : min(results[name])
+                       , "background_s" : min(background[name])
+                       }
+    print(json.dumps(report, indent = 2, sort_keys = True))
+    pygame.quit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+Copyright (c) Tobias Olausson (tobsan@tobsan.se) 2013
+
+This file is part of whutshmup
+
+whutshmup is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+whutshmup is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+whutshmup. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# suite.py
+#
+# Runs the game logic headless, using the SDL dummy drivers, in a number of
+# fixed scenarios with scripted input, as fast as it can. Reports ticks per
+# second, frame time percentiles and peak memory for each scenario as JSON.
+# Each scenario is run in a process of its own, so the peak memory of one does
+# not hide that of the next. Nothing depends on the wall clock, so two runs of
+# a scenario play out exactly the same, which is what makes them comparable.
+#
+#   python bench/suite.py [scenario ...] [--ticks N] [--output FILE]
+#                         [--allocations] [--gc-budget SECONDS|none]
+#                         [--compare-gc]
+#
+# With --allocations, the allocations and garbage collections of every frame
+# are tracked as well, see Allocations.py. That makes the frames a lot slower.
+#
+# Garbage is collected at the end of frames like in the game, with GC_BUDGET
+# from Common.py unless another budget is given. With none, the collector is
+# left alone. --compare-gc runs every scenario both ways and reports how the
+# frame time percentiles changed.
+#
+# Scenarios: level1, boss2_storm, choppers, preload_cold
+#
+
+import json
+import os
+import subprocess
+import sys
+from os.path import abspath, dirname
+from timeit import default_timer as clock
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from pygame.event import Event, post
+from pygame.locals import KEYDOWN, KEYUP
+
+from Alien import Chopper, SecondBoss
+from Common import RUNNING, FRAMERATE, GC_BUDGET
+from Graphics import Graphics
+from Level import Level, level_convert
+from Logic import GameLogic
+from Options import Options
+from Resources import Resources
+
+# Set by --allocations and --gc-budget
+TRACK_ALLOCATIONS = False
+COLLECTOR_BUDGET = GC_BUDGET
+
+def peak_memory():
+    """ Peak resident set size of this process in bytes, or None """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, OS X bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def start(preload = True, render = True, resolution = None):
+    """
+    Sets up pygame, the resources and a game logic with a player in it, the
+    same way the controller does, but with the sound effects and music off.
+    The window is made 32 bit since the dummy driver would otherwise give an 8
+    bit one, on which every alpha blit is many times slower than in the game.
+    The window has the default size unless a resolution is given.
+    """
+    pygame.mixer.pre_init(44100, -16, 2, 2048)
+    pygame.init()
+    options = Options()
+    options.music = False
+    options.sfx = False
+    if resolution is not None:
+        options.resolution = resolution
+    resources = Resources(None)
+    graphics = Graphics(resources, options, 32)
+    if preload:
+        resources.preload_all()
+    logic = GameLogic(graphics, resources, options, None, render)
+    logic.add_player()
+    logic.clear()
+    graphics.reset_distance()
+    graphics.set_scroll(5)
+    return (logic, graphics, options)
+
+def weave(options, tick):
+    """
+    Input script: fire all the time and sweep from one side of the screen to
+    the other, so the player both hits everything and gets hit
+    """
+    keys = set([options.fire])
+    phase = tick % 240
+    if phase < 100:
+        keys.add(options.left)
+    elif 120 <= phase < 220:
+        keys.add(options.right)
+    return keys
+
+def dodge(options, tick):
+    """ Input script: just move around, without killing anything """
+    return weave(options, tick) - set([options.fire])
+
+def play(logic, graphics, options, script, ticks):
+    """
+    Runs at most the given number of frames, with the keys the script holds
+    down in each frame posted as key events, like a real keyboard would.
+    """
+    profiler = logic.enable_profiler(False, None)
+    if TRACK_ALLOCATIONS:
+        logic.track_allocations()
+    collector = None
+    if COLLECTOR_BUDGET is not None:
+        collector = logic.schedule_gc(COLLECTOR_BUDGET)
+        collector.begin_level()
+    held = set()
+    begin = clock()
+    for tick in range(ticks):
+        keys = script(options, tick)
+        for key in sorted(keys - held):
+            post(Event(KEYDOWN, key = key))
+        for key in sorted(held - keys):
+            post(Event(KEYUP, key = key))
+        held = keys
+        start = clock()
+        if not logic.step() or logic.get_state() != RUNNING:
+            break
+        # The same as in the game loop, which would then wait for the clock
+        if collector:
+            collector.idle(1.0 / FRAMERATE - (clock() - start))
+    elapsed = clock() - begin
+    if collector:
+        collector.end_level()
+
+    tracker = logic.untrack_allocations()
+    frames = profiler.get_frames()
+    report = profiler.report()
+    return { 'allocations' : tracker.report() if tracker else None
+           , 'gc' : collector.get_stats() if collector else None
+           , 'ticks' : frames
+           , 'seconds' : elapsed
+           , 'ticks_per_second' : frames / elapsed if elapsed > 0 else None
+           , 'frame_ms' : milliseconds(report.pop('frame', None))
+           , 'phases_ms' : dict((phase, milliseconds(stats))
+                                for (phase, stats) in report.items())
+           , 'state' : logic.get_state()
+           , 'distance' : graphics.get_total_distance()
+           , 'enemies_left' : len(logic.get_enemies().sprites())
+           , 'lives_left' : logic.get_player().lives
+           }
+
+def milliseconds(stats):
+    if stats is None:
+        return None
+    return dict((key, value * 1000) for (key, value) in stats.items())
+
+#
+# Scenarios. Each takes the number of ticks to run, or None for its default.
+#
+
+def level1(ticks):
+    """
+    The first level from start to end. The player cannot die, so the whole
+    level is played through however badly the input script does.
+    """
+    (logic, graphics, options) = start()
+    logic.get_player().lives = 10**6
+    logic.set_level(level_convert()[0])
+    return play(logic, graphics, options, weave, ticks or 20000)
+
+def boss2_storm(ticks):
+    """
+    The second boss on its own, firing cluster shots that split into thirty
+    shots each. The player cannot die and does not fire back, so the storm
+    keeps going for as long as the scenario runs.
+    """
+    (logic, graphics, options) = start()
+    logic.get_player().lives = 10**6
+    boss = {'item' : SecondBoss, 'pos' : (300, -100)}
+    logic.set_level(Level([(0, [boss])]))
+    return play(logic, graphics, options, dodge, ticks or 1500)
+
+def choppers(ticks, count = 12):
+    """ A number of choppers hovering in two rows, all firing """
+    (logic, graphics, options) = start()
+    logic.get_player().lives = 10**6
+    items = []
+    for i in range(count):
+        x = 50 + (500 * (i // 2)) // max(1, (count - 1) // 2)
+        y = 60 + 80 * (i % 2)
+        items.append({'item' : Chopper, 'pos' : (x, -50), 'target' : (x, y)})
+    logic.set_level(Level([(0, items)]))
+    return play(logic, graphics, options, dodge, ticks or 1500)
+
+def preload_cold(_, rounds = 5):
+    """
+    Loads every asset into fresh resources a few times over, without the pixel
+    cache. There are no ticks in this one.
+    """
+    start(preload = False)
+    times = sorted(Resources(None).preload_all() for _ in range(rounds))
+    return { 'rounds' : len(times)
+           , 'seconds_min' : times[0]
+           , 'seconds_median' : times[len(times) // 2]
+           , 'seconds_max' : times[-1]
+           }
+
+SCENARIOS = [ ('level1', level1), ('boss2_storm', boss2_storm)
+            , ('choppers', choppers), ('preload_cold', preload_cold)
+            ]
+
+def run_one(name, ticks):
+    result = dict(SCENARIOS)[name](ticks)
+    result['peak_memory_bytes'] = peak_memory()
+    pygame.quit()
+    return result
+
+def run_child(name, ticks, budget):
+    """ Runs a scenario in a new process and returns its result """
+    command = [sys.executable, abspath(__file__), name, '--child']
+    if ticks is not None:
+        command += ['--ticks', str(ticks)]
+    if TRACK_ALLOCATIONS:
+        command.append('--allocations')
+    command += ['--gc-budget', str(budget).lower()]
+    out = subprocess.Popen(command, stdout = subprocess.PIPE).communicate()
+    return json.loads(out[0].decode().strip().splitlines()[-1])
+
+def compare(before, after):
+    """ How much the frame time percentiles changed, in milliseconds """
+    if before.get('frame_ms') is None or after.get('frame_ms') is None:
+        return None
+    return dict((key, after['frame_ms'][key] - before['frame_ms'][key])
+                for key in before['frame_ms'])
+
+def main():
+    global TRACK_ALLOCATIONS, COLLECTOR_BUDGET
+    args = sys.argv[1:]
+    ticks, output, child, both = None, None, False, False
+    names = []
+    while args:
+        arg = args.pop(0)
+        if arg == '--ticks':
+            ticks = int(args.pop(0))
+        elif arg == '--output':
+            output = args.pop(0)
+        elif arg == '--child':
+            child = True
+        elif arg == '--allocations':
+            TRACK_ALLOCATIONS = True
+        elif arg == '--gc-budget':
+            budget = args.pop(0)
+            COLLECTOR_BUDGET = None if budget == 'none' else float(budget)
+        elif arg == '--compare-gc':
+            both = True
+        else:
+            names.append(arg)
+    names = names or [name for (name, _) in SCENARIOS]
+    for name in names:
+        if name not in dict(SCENARIOS):
+            sys.exit("Unknown scenario: %s" % name)
+
+    # A child runs one scenario and prints its result for the parent
+    if child:
+        print(json.dumps(run_one(names[0], ticks)))
+        return
+
+    report = {}
+    for name in names:
+        if both:
+            before = run_child(name, ticks, None)
+            after = run_child(name, ticks, COLLECTOR_BUDGET or GC_BUDGET)
+            report[name] = { 'gc_default' : before
+                           , 'gc_scheduled' : after
+                           , 'frame_ms_change' : compare(before, after)
+                           }
+        else:
+            report[name] = run_child(name, ticks, COLLECTOR_BUDGET)
+
+    text = json.dumps(report, indent = 2, sort_keys = True)
+    if output is None:
+        print(text)
+    else:
+        f = open(output, "w")
+        f.write(text + "\n")
+        f.close()
+
+if __name__ == '__main__':
+    main()